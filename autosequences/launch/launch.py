@@ -25,7 +25,6 @@ spinner.start()
 
 # 3rd party modules
 from synnax.control.controller import Controller
-import synnax as sy
 
 # our modules
 from mclib import (
@@ -34,14 +33,19 @@ from mclib import (
     Config,
     average_ch,
     log,
-    sensor_vote,
+    VoteGroup,
     write_logs_to_file,
     open_vlv,
     close_vlv,
+    ValveHandle,
+    ValveBank,
 )
+from mclib.scheduler import Scheduler
+from mclib.offline import OfflinePlant, OfflineSynnax
 
 # standard modules
 import argparse
+import threading
 import time
 import math
 
@@ -76,6 +80,19 @@ def parse_args() -> argparse.Namespace:
         default="launch-autosequence.log",
         type=str,
     )
+    parser.add_argument(
+        "-o",
+        "--offline",
+        help="Run without Synnax against a simulated plant, using this simulation config (e.g. ../../simulation/config.yaml)",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "-a",
+        "--actuation",
+        help="Time every valve command until its state confirms it, and report per-valve latency at the end",
+        action="store_true",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -125,24 +142,35 @@ def global_abort(auto: Autosequence) -> None:
 
     confirm: str = ""
 
+    # Close every valve and open the vents (including press fill's) in a single frame
+    safing: dict[str, bool] = (
+        {valve: False for valve in valves_to_close}
+        | {vent: True for vent in vents}
+        | {press_fill_vent: True}
+    )
+    safing_valves = ValveBank(ctrl, config, list(safing.keys()))
+
+    # Reports when the safing valves' states confirm, without holding up the abort
+    def report_confirmation(start: float) -> None:
+        confirm_time: float | None = safing_valves.confirm(safing, start=start)
+        if confirm_time is not None:
+            log(f"Safing valves confirmed in {confirm_time * 1e3:.1f} ms", "green")
+        else:
+            unconfirmed: list[str] = safing_valves.unconfirmed(safing)
+            log(f"Safing valves not confirmed after 1s: {unconfirmed}", "red", True)
+
+    confirmation: threading.Thread | None = None
     try:
-        for valve in valves_to_close:
-            if config.is_vlv_nc(valve):
-                ctrl[valve] = False
-            else:
-                ctrl[valve] = True
-
-        for vent in vents:
-            if config.is_vlv_nc(vent):
-                ctrl[vent] = True
-            else:
-                ctrl[vent] = False
-        
-        ctrl["handoff_channel"] = False
+        start: float = time.perf_counter()
+        safing_valves.set(safing, extra={"handoff_channel": False})
+        auto.mark_safed()  # for the abort latency log
+        confirmation = threading.Thread(
+            name="Safing Confirmation", target=report_confirmation, args=(start,)
+        )
+        confirmation.start()
 
         log(f"Please wait {press_fill_vent_time} seconds to vent press fill safely...")
         log("Or, press Ctrl+C again to close press fill iso immediately")
-        open_vlv(ctrl, config, press_fill_vent)
         try:
             time.sleep(press_fill_vent_time)
         except KeyboardInterrupt:
@@ -159,6 +187,9 @@ def global_abort(auto: Autosequence) -> None:
         if confirm in ("y", "yes"):
             open_vlv(ctrl, config, copv_vent)
             log("COPV Vent opened.")
+        # Control is released after global_abort, so let the report finish first
+        if confirmation is not None:
+            confirmation.join()
 
 
 # Background task to always check for certain abort cases
@@ -175,7 +206,7 @@ def ox_fill(phase: Phase) -> None:
     ox_fill_margin = config.get_var("ox_fill_margin")
     ox_fill_lower_bound = ox_fill_target - ox_fill_margin
     ox_fill_upper_bound = ox_fill_target + ox_fill_margin
-    ox_fill = config.get_vlv("ox_fill_valve")
+    ox_fill = ValveHandle(ctrl, config, config.get_vlv("ox_fill_valve"))
     ox_level_sensor = config.get_pt("ox_level_sensor")
 
     ox_level = average_ch(
@@ -189,7 +220,7 @@ def ox_fill(phase: Phase) -> None:
             phase.log(
                 f"Current Ox level of {ox_level.get()} psid < {ox_fill_lower_bound} psid lower bound"
             )
-            open_vlv(ctrl, config, ox_fill)
+            ox_fill.open()
             phase.log(
                 f"Opening Ox Fill Valve until Ox Level >= {ox_fill_upper_bound} psid"
             )
@@ -199,13 +230,13 @@ def ox_fill(phase: Phase) -> None:
                 ox_level.add_and_get(ctrl.get(ox_level_sensor)) <= ox_fill_upper_bound
             ):
                 phase.sleep(0.10)  # yield thread
-                if open_vlv(ctrl, config, ox_fill):
+                if ox_fill.open():
                     phase.log(f"Re-opening Ox Fill Valve, resuming filling...")
 
             phase.log(
                 f"Target Ox level reached: {ox_level.get()}, closing Ox Fill Valve"
             )
-            close_vlv(ctrl, config, ox_fill)
+            ox_fill.close()
             phase.log("Continuing to monitor Ox level...")
         phase.sleep(0.01)  # yield thread
 
@@ -229,33 +260,35 @@ def ox_pre_press(phase: Phase) -> None:
     ox_pre_press_lower_bound = ox_pre_press_target - ox_pre_press_margin
     ox_pre_press_upper_bound = ox_pre_press_target + ox_pre_press_margin
 
-    ox_pre_press = config.get_vlv("ox_pre_press")
-    ox_vent = config.get_vlv("ox_vent")
-
-    ox_tank_pts: list[str] = [
-        config.get_pt("ox_tank_pt_1"),
-        config.get_pt("ox_tank_pt_2"),
-    ]
+    valves = ValveBank(
+        ctrl, config, [config.get_vlv("ox_pre_press"), config.get_vlv("ox_vent")]
+    )
+    ox_pre_press = valves[config.get_vlv("ox_pre_press")]
+    ox_vent = valves[config.get_vlv("ox_vent")]
+
+    # Logs once the PTs have disagreed (or agreed again) for half a second at either threshold below
+    ox_tank_pts = VoteGroup(
+        [config.get_pt("ox_tank_pt_1"), config.get_pt("ox_tank_pt_2")],
+        threshold=1.0,
+        client=phase.auto.client,
+    )
 
     ox_tank_pressure = average_ch(
         window=REFRESH_RATE / 2
     )  # 0.5 second window (NOTE: adjust as needed depending on acceptable lag)
 
     #Close ox vent
-    if config.is_vlv_nc(ox_vent):
-        ctrl[ox_vent] = False
-    else:
-        ctrl[ox_vent] = True
+    valves.set({ox_vent.name: False})
 
     while True:
         current_pressure: float = ox_tank_pressure.add_and_get(
-            value=sensor_vote(ctrl=ctrl, channels=ox_tank_pts, threshold=1.0)
+            value=ox_tank_pts.vote(ctrl)
         )
         if current_pressure < ox_pre_press_lower_bound:
             phase.log(
                 f"Current Ox pressure of {current_pressure} psid < {ox_pre_press_lower_bound} psid lower bound"
             )
-            open_vlv(ctrl, config, ox_pre_press)
+            ox_pre_press.open()
             phase.log(
                 f"Opening Ox Pre-Press until Ox Pressure >= {ox_pre_press_upper_bound} psid"
             )
@@ -263,12 +296,12 @@ def ox_pre_press(phase: Phase) -> None:
             # Wait until we have reached the target level
             while True:
                 current_pressure = ox_tank_pressure.add_and_get(
-                    value=sensor_vote(ctrl=ctrl, channels=ox_tank_pts, threshold=50)
+                    value=ox_tank_pts.vote(ctrl, threshold=50)
                 )
                 if current_pressure >= ox_pre_press_upper_bound:
                     break
                 phase.sleep(0.10)  # yield thread
-                if open_vlv(ctrl, config, ox_pre_press):
+                if ox_pre_press.open():
                     phase.log(
                         "Re-opening Ox Pre-Press Valve, resuming pressurization..."
                     )
@@ -276,7 +309,7 @@ def ox_pre_press(phase: Phase) -> None:
             phase.log(
                 f"Upper Bound Ox pressure reached: {current_pressure}, closing Ox Pre-Press"
             )
-            close_vlv(ctrl, config, ox_pre_press)
+            ox_pre_press.close()
             phase.log("Continuing to monitor Ox pressure...")
         phase.sleep(0.01)  # yield thread
 
@@ -288,9 +321,7 @@ def fuel_pre_press(phase: Phase) -> None:
     fuel_pre_press_time = config.get_var("fuel_pre_press_time")
     while True:
         phase.log(f"Press 'enter' to open fuel pre-press valve for {fuel_pre_press_time} seconds...")
-        phase.wait_for_input()
-        while phase._wait.is_set():
-            phase.sleep(0.1)
+        phase.wait_for_input(block=True)
         phase.log(f"Opening fuel pre-press valve for {fuel_pre_press_time} seconds...")
         ctrl[fuel_pre_press_valve] = True
         phase.sleep(fuel_pre_press_time)
@@ -327,23 +358,17 @@ def qd_disconnect(phase: Phase) -> None:
     press_fill_vent: str = config.get_vlv("Press_Fill_Vent")
 
     phase.log("Input enter to disconnect ox fill QD")
-    phase.wait_for_input()
-    while phase._wait.is_set():
-        phase.sleep(0.1)
+    phase.wait_for_input(block=True)
     open_vlv(ctrl, config, ox_fill_qd_pilot)
     phase.log("Ox fill QD disconnected")
     phase.log(
         "Input enter to disconnect ox pre-press QD"
     )  # NOTE: add venting then wait before QD
-    phase.wait_for_input()
-    while phase._wait.is_set():
-        phase.sleep(0.1)
+    phase.wait_for_input(block=True)
     open_vlv(ctrl, config, ox_pre_press_qd_pilot)
     phase.log("Ox pre-press QD disconnected")
     phase.log("Input enter to initiate COPV fill QD disconnect sequence")
-    phase.wait_for_input()
-    while phase._wait.is_set():
-        phase.sleep(0.1)
+    phase.wait_for_input(block=True)
     phase.log("Closing all press isos...")
     for iso in press_isos:
         close_vlv(ctrl, config, iso)
@@ -393,118 +418,111 @@ def launch_sequence(phase: Phase) -> None:
         )
         return
 
-    # track state variables
-    times_shown = set()  # to track which times have been shown in countdown
-    first_mpv_opened: bool = False
-    second_mpv_opened: bool = False
-    igniter_prompted: bool = False
-    igniter_confirmed: bool = False
-    first_iso_opened: bool = False
-    second_iso_opened: bool = False
+    first_mpv = first_mpv.lower()
 
-    phase.log("Hit 'enter' to start Launch Sequence")
-    phase.wait_for_input()
+    # Is this propellant being used in this test
+    def using(propellant: str) -> bool:
+        return (propellant == "ox" and using_ox) or (propellant == "fuel" and using_fuel)
 
-    while phase._wait.is_set():
-        phase.sleep(0.1)
+    phase.log("Hit 'enter' to start Launch Sequence")
+    phase.wait_for_input(block=True)
     phase.log("Beginning Launch Sequence...", "green", True)
     ctrl["handoff_channel"] = True
 
-    target_time: sy.TimeStamp = sy.TimeStamp.now() + sy.TimeSpan.from_seconds(
-        10.0
-    )  # time of ignition
-    igniter_start_time: sy.TimeStamp = target_time - sy.TimeSpan.from_seconds(
-        6.0
-    )  # time to prompt for igniter light
-    igniter_end_time: sy.TimeStamp = target_time - sy.TimeSpan.from_seconds(
-        2.0
-    )  # time to stop waiting for igniter light
-    first_mpv_open_time: sy.TimeStamp = target_time - sy.TimeSpan.from_seconds(
-        first_mpv_time
-    )
+    # Everything below is planned in seconds after the start of the countdown
+    target_time: float = 10.0  # time of ignition
+    igniter_start_time: float = target_time - 6.0  # time to prompt for igniter light
+    igniter_end_time: float = target_time - 2.0  # time to stop waiting for igniter light
+    first_mpv_open_time: float = target_time - first_mpv_time
 
     # Figure out iso open times
-    first_iso_open_time: sy.TimeStamp
-    second_iso_open_time: sy.TimeStamp
+    first_iso_open_time: float
+    second_iso_open_time: float
     if first_mpv == "ox":
-        first_iso_open_time = first_mpv_open_time - sy.TimeSpan.from_seconds(
-            ox_iso_time
-        )
-        second_iso_open_time = target_time - sy.TimeSpan.from_seconds(fuel_iso_time)
+        first_iso_open_time = first_mpv_open_time - ox_iso_time
+        second_iso_open_time = target_time - fuel_iso_time
     else:  # first_mpv == "fuel"
-        first_iso_open_time = first_mpv_open_time - sy.TimeSpan.from_seconds(
-            fuel_iso_time
-        )
-        second_iso_open_time = target_time - sy.TimeSpan.from_seconds(ox_iso_time)
+        first_iso_open_time = first_mpv_open_time - fuel_iso_time
+        second_iso_open_time = target_time - ox_iso_time
 
-    while True:
-        phase.sleep(0)
-        now: sy.TimeStamp = sy.TimeStamp.now()
+    def prompt_igniter() -> None:
+        open_vlv(ctrl, config, igniter)
+        phase.wait_for_input()
+        phase.log("Press 'enter' to confirm smoke...", "yellow", True)
 
-        if now >= igniter_end_time and phase._wait.is_set():
+    def check_igniter() -> bool:
+        if phase._wait.is_set():
+            # The countdown's T-2 never fires once this cancels the schedule, so log it here
             phase.log("T-2")
             phase.log("No ignition. Ending sequence.", "red", True)
             ctrl["handoff_channel"] = False
-            ctrl[igniter] = False 
+            ctrl[igniter] = False
             phase.stop_waiting_for_input()
-            return
-        elif now >= igniter_end_time and not igniter_confirmed:
-            #NOTE: This is actually what is ran when the igniter HAS been confirmed.
-            #       "not igniter_confirmed" just ensures that we don't print this 
-            #        message multiple times after the end time has passed.
-            phase.log("Ignition confirmed. Continuing with Launch Sequence...", "green", True)
-            igniter_confirmed = True
-
-        if now >= igniter_start_time and not igniter_prompted:
-            phase.log("Press 'enter' to confirm smoke...", "yellow", True)
-            open_vlv(ctrl, config, igniter)
-            phase.wait_for_input()
-            igniter_prompted = True
-
-        if now >= first_iso_open_time and not first_iso_opened:
-            if (first_mpv == "ox" and using_ox) or (first_mpv == "fuel" and using_fuel):
-                phase.log(f"Opening {first_mpv.upper()} ISO...")
-                open_vlv(ctrl, config, config.get_vlv(f"{first_mpv}_dome_iso"))
-            first_iso_opened = True
-
-        if now >= second_iso_open_time and not second_iso_opened:
-            if (second_mpv == "ox" and using_ox) or (
-                second_mpv == "fuel" and using_fuel
-            ):
-                phase.log(f"Opening {second_mpv.upper()} ISO...")
-                open_vlv(ctrl, config, config.get_vlv(f"{second_mpv}_dome_iso"))
-            second_iso_opened = True
-
-        if now >= first_mpv_open_time and not first_mpv_opened:
-            if (first_mpv == "ox" and using_ox) or (first_mpv == "fuel" and using_fuel):
-                phase.log(f"Opening {first_mpv.upper()} MPV...")
-                open_vlv(ctrl, config, config.get_vlv(f"{first_mpv}_mpv"))
-            first_mpv_opened = True
-
-        if now >= target_time and not second_mpv_opened:
-            if (second_mpv == "ox" and using_ox) or (
-                second_mpv == "fuel" and using_fuel
-            ):
-                phase.log(f"Opening {second_mpv.upper()} MPV...")
-                open_vlv(ctrl, config, config.get_vlv(f"{second_mpv}_mpv"))
-                
-            second_mpv_opened = True
-            phase.log("IGNITION.", "red", True)
-            close_vlv(ctrl, config, igniter)  # close igniter valve after ignition
-            #post_ignition_sequence(phase) #NOTE: ONLY FOR COLDFLOWS
-            phase.log("Launch autosequence complete.", "green", True)
-            break
-
-        remaining_span = sy.TimeSpan(target_time - now)
-        remaining_seconds: float | None = sy.TimeSpan.to_seconds(remaining_span)
-        if remaining_seconds is None:
-            remaining_seconds_int = 0
-        else:
-            remaining_seconds_int = int(math.ceil(remaining_seconds))
-        if remaining_seconds_int not in times_shown:
-            phase.log(f"T-{remaining_seconds_int}")
-            times_shown.add(remaining_seconds_int)
+            return False
+        phase.log("Ignition confirmed. Continuing with Launch Sequence...", "green", True)
+        return True
+
+    # Valve actions only write commands, their logs run as the scheduler's follow-ups once
+    # every action planned for the same time has fired
+    def open_iso(propellant: str) -> None:
+        if using(propellant):
+            open_vlv(ctrl, config, config.get_vlv(f"{propellant}_dome_iso"))
+
+    def open_mpv(propellant: str) -> None:
+        if using(propellant):
+            open_vlv(ctrl, config, config.get_vlv(f"{propellant}_mpv"))
+
+    def log_opening(propellant: str, valve: str) -> None:
+        if using(propellant):
+            phase.log(f"Opening {propellant.upper()} {valve}...")
+
+    def ignition() -> None:
+        open_mpv(second_mpv)
+        close_vlv(ctrl, config, igniter)  # close igniter valve after ignition
+
+    def log_ignition() -> None:
+        log_opening(second_mpv, "MPV")
+        phase.log("IGNITION.", "red", True)
+        # post_ignition_sequence(phase) #NOTE: ONLY FOR COLDFLOWS
+
+    # Actions at the same time fire in the order they're added, valves before the countdown
+    schedule = Scheduler(sleep=phase.sleep)
+    schedule.add("Igniter check", igniter_end_time, check_igniter, record=False)
+    schedule.add("Igniter", igniter_start_time, prompt_igniter)
+    schedule.add(
+        f"{first_mpv.upper()} ISO",
+        first_iso_open_time,
+        lambda: open_iso(first_mpv),
+        after=lambda: log_opening(first_mpv, "ISO"),
+    )
+    schedule.add(
+        f"{second_mpv.upper()} ISO",
+        second_iso_open_time,
+        lambda: open_iso(second_mpv),
+        after=lambda: log_opening(second_mpv, "ISO"),
+    )
+    schedule.add(
+        f"{first_mpv.upper()} MPV",
+        first_mpv_open_time,
+        lambda: open_mpv(first_mpv),
+        after=lambda: log_opening(first_mpv, "MPV"),
+    )
+    schedule.add(f"{second_mpv.upper()} MPV", target_time, ignition, after=log_ignition)
+    for t_minus in range(int(math.ceil(target_time)), 0, -1):
+        schedule.add(
+            f"T-{t_minus}",
+            target_time - t_minus,
+            lambda t_minus=t_minus: phase.log(f"T-{t_minus}"),
+            record=False,
+        )
+
+    completed: bool = schedule.run()
 
+    # Log valve timing after the fact so it can't delay any of the actions
+    for name, skew in schedule.skews:
+        phase.log(f"{name} commanded {skew * 1e3:+.3f} ms from plan")
+    if completed:
+        phase.log("Launch autosequence complete.", "green", True)
     return
 
 
@@ -606,6 +624,19 @@ def main() -> None:
     config: Config = Config(filepath=args.config)
     cluster: str = args.cluster
 
+    # In offline mode, run the simulated plant in this process instead of using Synnax
+    client: OfflineSynnax | None = None
+    plant: OfflinePlant | None = None
+    if args.offline != "":
+        client = OfflineSynnax()
+        plant = OfflinePlant(
+            client,
+            Config(filepath=args.offline),
+            frequency=REFRESH_RATE,
+            extra_config=config,  # valves the simulation doesn't model just echo back
+        )
+        plant.start()
+
     # Make Autosequence object, also connects to Synnax & other checks
     auto: Autosequence = Autosequence(
         name="Limelight Launch Autosequence",
@@ -613,6 +644,8 @@ def main() -> None:
         config=config,
         global_abort=global_abort,
         background_thread=background_thread,
+        client=client,  # type: ignore
+        monitor_actuation=args.actuation,
     )
 
     # Define and add each phase to the autosequence
@@ -661,11 +694,14 @@ def main() -> None:
     auto.add_phase(launch_phase)
 
     spinner.stop()  # stop the "initializing..." spinner since we're done loading all the imports and setup
+    auto.log_startup_times()
 
     # auto.init_valves() # initialize valves to default states
 
     # Run the autosequence
     auto.run()
+    if plant is not None:
+        plant.stop()
 
     log("Autosequence has terminated, have a great flight!")
 
@@ -1,6 +1,12 @@
 from mclib.config import Config
 from mclib.logger import log, write_logs_to_file, printf
-from mclib.average import average_ch, sensor_vote, sensor_vote_values
+from mclib.average import (
+    average_ch,
+    EWMABank,
+    VoteGroup,
+    sensor_vote,
+    sensor_vote_values,
+)
 from mclib.phase import Phase, SequenceAborted, SequenceExited
 from mclib.autosequence import Autosequence
-from mclib.utils import open_vlv, close_vlv, STATE
+from mclib.utils import open_vlv, close_vlv, STATE, ValveHandle, ValveBank
@@ -0,0 +1,139 @@
+from typing import Any
+import threading
+import time
+import numpy as np
+from synnax.control.controller import Controller
+from mclib.logger import log
+from mclib.utils import FRAME_POLL_PERIOD, add_frame_processor, remove_frame_processor
+
+
+class _StateWatcher:
+    """
+    Controller processor that confirms pending valve commands against their state channels
+    once per frame, on the controller's receiver thread
+    """
+
+    monitor: "ActuationMonitor"
+
+    def __init__(self, monitor: "ActuationMonitor"):
+        self.monitor = monitor
+
+    def process(self, state: Controller) -> None:
+        self.monitor._confirm(time.perf_counter())
+
+
+class ActuationMonitor:
+    """
+    Opt-in controller proxy which timestamps every valve command and watches the matching
+    *_state channel, recording the command -> state confirmation latency per valve.
+    Everything else is passed straight through to the wrapped controller, so it can be used
+    anywhere a Controller is (open_vlv, close_vlv, phases, ...)
+
+    Commands that don't change the valve's current state aren't timed, and commands that are
+    superseded before being confirmed are counted as unconfirmed
+    """
+
+    ctrl: Controller
+    latencies: dict[str, list[float]]  # valve -> confirmation latencies, seconds
+    unconfirmed: dict[str, int]  # valve -> commands never confirmed
+
+    _pending: dict[str, tuple[bool, float]]  # valve -> (commanded value, command time)
+    _lock: threading.Lock
+    _watcher: _StateWatcher
+    _per_frame: bool  # Whether _watcher runs once per frame, or on a polling thread
+    _released: threading.Event
+
+    def __init__(self, ctrl: Controller):
+        # Bypass our own __setattr__ passthrough for our attributes
+        object.__setattr__(self, "ctrl", ctrl)
+        object.__setattr__(self, "latencies", {})
+        object.__setattr__(self, "unconfirmed", {})
+        object.__setattr__(self, "_pending", {})
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_watcher", _StateWatcher(self))
+        object.__setattr__(self, "_released", threading.Event())
+        object.__setattr__(self, "_per_frame", add_frame_processor(ctrl, self._watcher))
+        if not self._per_frame:  # No frame callbacks, confirm on a polling thread instead
+            threading.Thread(
+                name="Actuation Monitor", target=self._poll, daemon=True
+            ).start()
+
+    def _poll(self) -> None:
+        while not self._released.wait(FRAME_POLL_PERIOD):
+            self._watcher.process(self.ctrl)
+
+    def _track(self, channel: Any, value: Any) -> None:
+        if not isinstance(channel, str) or "vlv" not in channel:
+            return
+        target: bool = bool(value)
+        current = self.ctrl.get(channel.replace("vlv", "state"))
+        with self._lock:
+            if channel in self._pending:  # Superseded before it was confirmed
+                self.unconfirmed[channel] = self.unconfirmed.get(channel, 0) + 1
+                del self._pending[channel]
+            if current is not None and bool(current) != target:
+                self._pending[channel] = (target, time.perf_counter())
+
+    def _confirm(self, now: float) -> None:
+        with self._lock:
+            if len(self._pending) == 0:
+                return
+            for valve, (target, command_time) in list(self._pending.items()):
+                current = self.ctrl.get(valve.replace("vlv", "state"))
+                if current is not None and bool(current) == target:
+                    self.latencies.setdefault(valve, []).append(now - command_time)
+                    del self._pending[valve]
+
+    def set(self, channel: Any, value: Any = None) -> None:
+        if isinstance(channel, dict):
+            for ch, ch_value in channel.items():
+                self._track(ch, ch_value)
+        else:
+            self._track(channel, value)
+        self.ctrl.set(channel, value)
+
+    def __setitem__(self, channel: Any, value: Any) -> None:
+        self.set(channel, value)
+
+    def __getitem__(self, channel: Any) -> Any:
+        return self.ctrl[channel]
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.ctrl, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.ctrl, name, value)
+
+    def release(self) -> None:
+        if self._per_frame:
+            remove_frame_processor(self.ctrl, self._watcher)
+        self._released.set()
+        self.ctrl.release()
+
+    def report(self, names: dict[str, str] | None = None) -> None:
+        """
+        Logs per-valve command -> state latency percentiles
+        names optionally maps synnax names to readable names (e.g. config aliases)
+        """
+        with self._lock:
+            valves: list[str] = sorted(
+                set(self.latencies) | set(self.unconfirmed) | set(self._pending)
+            )
+            if len(valves) == 0:
+                log("Actuation latency: no valve commands were timed")
+                return
+            log("Actuation latency (command -> state confirmed):", bold=True)
+            for valve in valves:
+                name: str = names.get(valve, valve) if names is not None else valve
+                samples = np.array(self.latencies.get(valve, [])) * 1e3
+                missed: int = self.unconfirmed.get(valve, 0) + (valve in self._pending)
+                if len(samples) == 0:
+                    log(f"  {name}: no confirmed commands, {missed} unconfirmed", "red")
+                    continue
+                p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+                log(
+                    f"  {name}: n={len(samples)} p50 {p50:.1f} ms  p90 {p90:.1f} ms  "
+                    f"p99 {p99:.1f} ms  max {samples.max():.1f} ms"
+                    + (f", {missed} unconfirmed" if missed > 0 else ""),
+                    "red" if missed > 0 else "white",
+                )
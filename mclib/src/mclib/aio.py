@@ -0,0 +1,493 @@
+from __future__ import annotations
+from typing import Any, Callable, Coroutine
+import asyncio
+import inspect
+import time
+import synnax as sy
+from synnax.control.controller import Controller
+from mclib.config import Config
+from mclib.logger import log
+from mclib.average import average_ch, sensor_vote
+from mclib.phase import SequenceAborted, SequenceExited
+from mclib.autosequence import Autosequence
+from mclib.utils import FRAME_POLL_PERIOD, add_frame_processor, remove_frame_processor
+from prompt_toolkit.patch_stdout import patch_stdout
+
+import mclib.phase
+
+
+class _FrameHub:
+    """
+    Controller processor that hands new frames to the event loop. Every AsyncPhase waiting
+    in wait_until registers its condition here, and they are all evaluated together on the
+    loop thread, at most once per frame. Frames that arrive while an evaluation is already
+    queued are coalesced into it, so a busy loop never builds up a backlog
+    """
+
+    waiters: dict["AsyncPhase", Callable[[Controller], bool]]
+    loop: asyncio.AbstractEventLoop | None
+
+    _ctrl: Controller
+    _pending: bool
+
+    def __init__(self, ctrl: Controller):
+        self.waiters = {}
+        self.loop = None
+        self._ctrl = ctrl
+        self._pending = False
+
+    # Runs on the controller's receiver thread
+    def process(self, state: Controller) -> None:
+        if self._pending or len(self.waiters) == 0 or self.loop is None:
+            return
+        self._pending = True
+        self.loop.call_soon_threadsafe(self._broadcast)
+
+    # Runs on the loop thread
+    def _broadcast(self) -> None:
+        self._pending = False
+        for phase, cond in list(self.waiters.items()):
+            try:
+                met: bool = cond(self._ctrl)
+            except Exception as e:
+                phase._exc = e
+                met = True
+            if met:
+                del self.waiters[phase]
+                phase._met = True
+                phase._wake.set()
+
+
+class AsyncPhase:
+    """
+    A Phase that runs as a coroutine on the AsyncAutosequence's event loop instead of on its
+    own thread. main_func is an `async def` taking the phase, and uses `await phase.sleep()`,
+    `await phase.wait_until()`, and `await phase.wait_for_input()` to yield.
+    Abort and quit cancel the phase's task, so it stops at whatever it is awaiting; the safe
+    function (sync or async) then runs, the same as a threaded Phase
+    """
+
+    name: str
+
+    ctrl: Controller
+    config: Config
+
+    auto: "AsyncAutosequence"
+
+    phase_start_time: sy.TimeStamp | None = None
+    runs: int  # Number of times the phase has been started
+
+    _abort: bool
+    _quit: bool
+    _pause: bool
+    _unpaused: asyncio.Event  # Set whenever the phase isn't paused
+    _wait: asyncio.Event  # Set while waiting for input
+    _wake: asyncio.Event  # Wakes sleep / wait_until / wait_for_input to re-check
+    _met: bool  # wait_until's condition was met, set by the _FrameHub
+    _exc: Exception | None  # raised by a wait_until condition
+
+    _main_func: Callable[["AsyncPhase"], Coroutine[Any, Any, None]]
+    _safe_func: Callable | None = None  # Optional safe function to run on abort
+    _task: asyncio.Task | None
+    _start_requested: bool  # start() was called before the event loop was running
+
+    _refresh_rate: int  # Hz
+    _refresh_period: float
+
+    def __init__(
+        self,
+        name: str,
+        ctrl: Controller,
+        config: Config,
+        main_func: Callable[["AsyncPhase"], Coroutine[Any, Any, None]],
+        auto: "AsyncAutosequence",
+        safe_func: Callable | None = None,
+        refresh_rate: int = 50,
+    ):
+        self.name: str = name
+
+        self.ctrl: Controller = ctrl
+        self.config: Config = config
+        self.auto: AsyncAutosequence = auto
+
+        self._refresh_rate: int = refresh_rate
+        self._refresh_period: float = 1.0 / (2.0 * self._refresh_rate)
+
+        self._main_func = main_func
+        self._safe_func: Callable | None = safe_func
+        self._task = None
+        self._start_requested = False
+        self.runs = 0
+
+        self._abort = False
+        self._quit = False
+        self._pause = False
+        self._unpaused = asyncio.Event()
+        self._unpaused.set()
+        self._wait = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._met = False
+        self._exc = None
+
+    # Runs func on the event loop thread, directly if we're already on it
+    def _call(self, func: Callable[[], None]) -> None:
+        loop: asyncio.AbstractEventLoop | None = self.auto._loop
+        try:
+            running: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is None or running is loop:
+            func()
+        else:
+            loop.call_soon_threadsafe(func)
+
+    # Checks for abort or pause signals. Waits if paused
+    async def _check_signals(self) -> None:
+        if self._abort:
+            raise SequenceAborted("Sequence Aborted")
+
+        if self._pause:
+            await self._run_safe_func()
+            await self._unpaused.wait()  # abort and quit cancel this
+
+        if self._quit:
+            raise SequenceExited()
+
+    async def _run_safe_func(self) -> None:
+        if self._safe_func is None:
+            return
+        result = self._safe_func(self)
+        if inspect.isawaitable(result):
+            await result
+
+    # Sleep function that should be used inside of the control sequence
+    # Yields to the other phases, wakes immediately on pause, and is cancelled by abort/quit
+    async def sleep(self, duration: float) -> None:
+        end_time: float = time.monotonic() + duration
+        while True:
+            await self._check_signals()
+            remaining: float = end_time - time.monotonic()
+            if remaining <= 0:
+                return
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=remaining)
+            except TimeoutError:
+                pass
+
+    # Similar to Phase.wait_until(), the condition is checked once against the current state,
+    # then at most once per new frame the controller receives, on the loop thread
+    async def wait_until(
+        self, cond: Callable[[Controller], bool], timeout: float | None = None
+    ) -> bool:
+        end_time: float | None = None
+        if timeout is not None:
+            end_time = time.monotonic() + timeout
+
+        await self._check_signals()
+        if cond(self.ctrl):
+            return True
+
+        self._met = False
+        self._exc = None
+        self.auto._frames.waiters[self] = cond
+        try:
+            while True:
+                await self._check_signals()
+                if self._met:
+                    break
+                remaining: float | None = None
+                if end_time is not None:
+                    remaining = end_time - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=remaining)
+                except TimeoutError:
+                    pass
+        finally:
+            self.auto._frames.waiters.pop(self, None)
+        if self._exc is not None:
+            raise self._exc
+        return True
+
+    async def avg_and_vote_for(
+        self,
+        ctrl: Controller,
+        channels: list[str],
+        threshold: float,
+        averaging_time: float,
+    ) -> float:
+        """
+        Helper function to both average and vote on a set of channels over a given time period, useful for getting a baseline reading
+        """
+        value = average_ch(round(self._refresh_rate * averaging_time))
+        end_time: sy.TimeStamp = sy.TimeStamp.now() + sy.TimeSpan.from_seconds(
+            averaging_time
+        )
+        while sy.TimeStamp.now() < end_time:
+            value.add(sensor_vote(ctrl, channels, threshold))
+            await self.sleep(self._refresh_period)  # allow time to yield
+        return value.get()
+
+    def log(self, msg: str, color: str = "white", bold: bool = False) -> None:
+        """
+        Log wrapper that inserts the phase name responsible for the log entry
+        """
+        log(msg=msg, color=color, bold=bold, phase_name=self.name)
+
+    # Name of the child range for the current run, later runs get numbered
+    def _range_name(self) -> str:
+        if self.runs <= 1:
+            return self.name
+        return f"{self.name} run {self.runs}"
+
+    # A coroutine wrapper to do abort handling, cancellation (abort / quit) lands here too
+    async def _func_wrapper(self) -> None:
+        try:
+            await self._main_func(self)
+        except (Exception, asyncio.CancelledError):
+            await self._run_safe_func()
+        finally:
+            if mclib.phase.parent_range is not None:
+                await asyncio.to_thread(
+                    mclib.phase.parent_range.create_child_range,
+                    name=self._range_name(),
+                    time_range=sy.TimeRange(self.phase_start_time, sy.TimeStamp.now()),
+                    color="#000034",
+                )
+
+    # Must run on the loop thread
+    def _create_task(self) -> None:
+        self._start_requested = False
+        if self.is_running():
+            return
+        # Re-arm, flags from the previous run would stop this one immediately
+        self._abort = False
+        self._quit = False
+        self._pause = False
+        self._unpaused.set()
+        self._wait.clear()
+        self.runs += 1
+        if self.runs > 1:
+            log(f"Restarting phase {self.name} (run {self.runs})")
+        self.phase_start_time = sy.TimeStamp.now()
+        self._task = asyncio.get_running_loop().create_task(
+            self._func_wrapper(), name=self.name
+        )
+
+    # Starts the phase, or restarts it if a previous run has finished (e.g. after an abort)
+    def start(self) -> None:
+        if self.is_running() or self._start_requested:
+            log(f"Phase {self.name} already running")
+        elif self.auto._loop is None:
+            # Started before the autosequence is running, it will create the task
+            self._start_requested = True
+        else:
+            self._call(self._create_task)
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def join(self) -> None:
+        if self._task is not None:
+            await asyncio.wait([self._task])
+
+    def _cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def abort(self) -> None:
+        self._abort = True
+        self._call(self._cancel)
+
+    def quit(self) -> None:
+        self._quit = True
+        self._call(self._cancel)
+
+    def pause(self) -> None:
+        def pause() -> None:
+            self._pause = True
+            self._unpaused.clear()
+            self._wake.set()
+
+        self._call(pause)
+
+    def unpause(self) -> None:
+        def unpause() -> None:
+            self._pause = False
+            self._unpaused.set()
+
+        self._call(unpause)
+
+    # Waits for the operator to hit enter in the command interface
+    # With block=True, returns once they have (pause is handled, abort / quit cancel it)
+    async def wait_for_input(self, block: bool = False) -> None:
+        self._wait.set()
+        await self._check_signals()
+        while block and self._wait.is_set():
+            self._wake.clear()
+            await self._wake.wait()
+            await self._check_signals()
+
+    def stop_waiting_for_input(self) -> None:
+        def stop() -> None:
+            self._wait.clear()
+            self._wake.set()
+
+        self._call(stop)
+
+
+class AsyncAutosequence(Autosequence):
+    """
+    An Autosequence that runs every phase, the command interface, and the optional
+    background task as coroutines on a single event loop thread. Use AsyncPhase for its
+    phases. Frames from the controller are handed to the loop once each, so dozens of
+    concurrent monitor phases (fills, watchdogs, redlines) cost no threads and no polling
+    """
+
+    phases: list[AsyncPhase]  # type: ignore
+
+    _loop: asyncio.AbstractEventLoop | None
+    _stop: asyncio.Event | None  # Set on the loop when abort_flag or quit is set
+    _frames: _FrameHub
+    _background_func: Callable | None
+
+    def __init__(
+        self,
+        name: str,
+        cluster: str,
+        config: Config,
+        global_abort: Callable | None = None,
+        background_task: Callable | None = None,
+        client: sy.Synnax | None = None,
+        monitor_actuation: bool = False,
+    ):
+        self._loop = None
+        self._stop = None
+        super().__init__(
+            name=name,
+            cluster=cluster,
+            config=config,
+            global_abort=global_abort,
+            client=client,
+            monitor_actuation=monitor_actuation,
+        )
+        self._frames = _FrameHub(self.ctrl)
+        self._background_func = background_task
+
+    # Safe to call from any thread
+    def raise_abort(self) -> None:
+        super().raise_abort()
+        self._wake_run()
+
+    def _wake_run(self) -> None:
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    # Run the command interface & every started phase until abort or quit
+    def run(self) -> None:
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        self.start_time = sy.TimeStamp.now()
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._frames.loop = self._loop
+        per_frame: bool = add_frame_processor(self.ctrl, self._frames)
+        poll: asyncio.Task | None = None
+        if not per_frame:  # No frame callbacks, hand the state to the loop every poll
+            poll = asyncio.create_task(self._poll_frames(), name="Autosequence Frame Poll")
+        if self.abort_flag.is_set() or self._has_clean_quit.is_set():
+            self._stop.set()
+
+        try:
+            with patch_stdout():  # Fix print statements with command interface
+                for phase in self.phases:
+                    if phase._start_requested:
+                        phase._create_task()
+                background: asyncio.Task | None = None
+                if self._background_func is not None:
+                    background = asyncio.create_task(
+                        self._background_func(self), name="Autosequence Background"
+                    )
+                interface: asyncio.Task = asyncio.create_task(
+                    self._interface_async(), name="Autosequence Interface"
+                )
+                # Wait until either abort or quit is signalled
+                await self._stop.wait()
+                if self.abort_flag.is_set():
+                    await self._abort_all_async(interface, background)
+                else:
+                    await self._quit_all_async(interface, background)
+        finally:
+            if per_frame:
+                remove_frame_processor(self.ctrl, self._frames)
+            if poll is not None:
+                poll.cancel()
+            self._loop = None
+
+    async def _poll_frames(self) -> None:
+        while True:
+            self._frames.process(self.ctrl)
+            await asyncio.sleep(FRAME_POLL_PERIOD)
+
+    def _phase_tasks(self) -> list[asyncio.Task]:
+        return [phase._task for phase in self.phases if phase._task is not None]
+
+    async def _abort_all_async(
+        self, interface: asyncio.Task, background: asyncio.Task | None
+    ) -> None:
+        # Cancel every phase first, everything else can wait
+        for phase in self.phases:
+            phase.abort()
+        signaled_time: float = time.perf_counter()
+        interface.cancel()
+        # Wait for each phase to run its safe function
+        await asyncio.gather(*self._phase_tasks(), return_exceptions=True)
+        phases_safed_time: float = time.perf_counter()
+        await asyncio.gather(interface, return_exceptions=True)
+        if self.global_abort is not None:
+            if inspect.iscoroutinefunction(self.global_abort):
+                await self.global_abort(self)
+            else:
+                # Off the loop, so it can block on state confirmation
+                await asyncio.to_thread(self.global_abort, self)
+        # If global_abort didn't report when the valves were commanded, use when it returned
+        self.mark_safed()
+        self._log_abort_latency(signaled_time, phases_safed_time)
+        if background is not None:
+            background.cancel()
+            await asyncio.gather(background, return_exceptions=True)
+        self.release()
+        log("Autosequence aborted successfully")
+
+    async def _quit_all_async(
+        self, interface: asyncio.Task, background: asyncio.Task | None
+    ) -> None:
+        await asyncio.gather(interface, return_exceptions=True)
+        for phase in self.phases:
+            phase.quit()
+        await asyncio.gather(*self._phase_tasks(), return_exceptions=True)
+        if background is not None:
+            background.cancel()
+            await asyncio.gather(background, return_exceptions=True)
+        self.release()
+
+    async def _interface_async(self) -> None:
+        try:
+            self._prompt_session = self._setup_interface()
+            while not self.abort_flag.is_set():  # Parse input
+                user_input: str = await self._prompt_session.prompt_async(" > ")
+                if self.abort_flag.is_set():
+                    return  # exit if abort flag set during prompt
+                if not self._handle_input(user_input):
+                    self._wake_run()
+                    return
+        except KeyboardInterrupt:
+            log("Keyboard interrupt detected, aborting!")
+            self.raise_abort()
+        except EOFError:
+            log("Keyboard interrupt detected, aborting!")
+            self.raise_abort()
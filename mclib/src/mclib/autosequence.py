@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Callable, List, Dict
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import synnax as sy
 from synnax.control.controller import Controller
 from mclib.config import Config
@@ -11,7 +12,8 @@ from prompt_toolkit.completion import NestedCompleter
 from prompt_toolkit.shortcuts import CompleteStyle
 from prompt_toolkit.patch_stdout import patch_stdout
 
-from mclib.phase import Phase
+from mclib.phase import Phase, SignalEvent
+from mclib.actuation import ActuationMonitor
 
 
 class Autosequence:
@@ -28,17 +30,20 @@ class Autosequence:
     phases: list[Phase]
     config: Config
     global_abort: Callable | None
-    abort_flag: threading.Event  # Thread-safe flag
+    abort_flag: SignalEvent  # Thread-safe flag
 
     start_time: sy.TimeStamp
     aliases: Dict[int | str, str]
+    startup_times: Dict[str, float]  # startup step -> seconds, see log_startup_times()
 
     # Private members
     _has_released: bool
     _background_thread: threading.Thread | None = None
     _interface_thread: threading.Thread | None = None
     _prompt_session: PromptSession | None = None
-    _has_clean_quit: threading.Event
+    _has_clean_quit: SignalEvent
+    _signal: threading.Condition  # Notified whenever abort_flag or _has_clean_quit is set
+    _safed_time: float | None  # When global_abort reported valves commanded, see mark_safed()
 
     # Constructor
     def __init__(
@@ -48,6 +53,8 @@ class Autosequence:
         config: Config,
         global_abort: Callable | None = None,
         background_thread: Callable | None = None,
+        client: sy.Synnax | None = None,
+        monitor_actuation: bool = False,
     ):
         self._has_released = False
         self.start_time = sy.TimeStamp.now()
@@ -55,24 +62,21 @@ class Autosequence:
         self.config: Config = config
         self.phases: List[Phase] = []
         self.global_abort: Callable | None = global_abort
-        self.abort_flag: threading.Event = threading.Event()
+        self._signal = threading.Condition()
+        self.abort_flag: SignalEvent = SignalEvent(self._signal)
         self.abort_flag.clear()  # Make sure flag is cleared initially
-        self._has_clean_quit: threading.Event = threading.Event()
+        self._has_clean_quit: SignalEvent = SignalEvent(self._signal)
         self._has_clean_quit.clear()
+        self._safed_time = None
 
-        # Try to login
-        self.client: sy.Synnax = self.synnax_login(cluster)
+        startup_start: float = time.perf_counter()
+        self.startup_times = {}
 
-        # Make range
-        day: str = sy.TimeStamp.now().datetime().strftime("%m/%d")
-        run: int = len(self.client.ranges.search(term=f"{self.name} {day} run")) + 1
-
-        import mclib.phase
-
-        mclib.phase.parent_range = self.client.ranges.create(
-            name=f"{self.name} {day} run {run}",
-            time_range=sy.TimeRange(sy.TimeStamp.now(), sy.TimeStamp.now()),
-        )
+        # Try to login, unless given a client (e.g. an mclib.offline.OfflineSynnax)
+        if client is not None:
+            self.client: sy.Synnax = client
+        else:
+            self.client: sy.Synnax = self._timed("login", self.synnax_login, cluster)
 
         # join all dicts together
         all_channels: Dict[str, str] = (
@@ -86,24 +90,24 @@ class Autosequence:
         self.aliases: Dict[int | str, str] = {
             alias: name.replace("_", " ") for alias, name in self.aliases.items()
         }
-        # apply aliases
-        mclib.phase.parent_range.set_alias(self.aliases)
 
-        # Take control with autosequence
-        self.ctrl: Controller = self.client.control.acquire(
-            name=name,
-            write_authorities=100,  # 1 is the default console authority for reference
-            write=self.config.get_vlvs() + ["handoff_channel"],
-            read=self.config.get_sensors() + self.config.get_states(),
-        )
-        self._has_released = False
+        # The run range and taking control don't depend on each other, so do them at once
+        with ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="Autosequence Startup"
+        ) as pool:
+            range_setup: Future = pool.submit(self._setup_range)
+            control_setup: Future = pool.submit(self._take_control, monitor_actuation)
+            self.ctrl, defined = control_setup.result()
+            self._has_released = False
+            try:
+                range_setup.result()
+            except Exception:
+                self.release()
+                raise
+
+        self.startup_times["total"] = time.perf_counter() - startup_start
 
         # Error if not all channels were found / defined
-        channels: list[str] = self.config.get_sensors() + self.config.get_states()
-        defined: bool = self.ctrl.wait_until_defined(
-            channels=channels,  # type: ignore
-            timeout=10,
-        )
         if not defined:
             self.release()
             raise Exception(
@@ -134,6 +138,70 @@ class Autosequence:
                 color="#003400",
             )
 
+    # Runs func, recording how long it took under startup_times[step]
+    def _timed(self, step: str, func: Callable, *args, **kwargs):
+        step_start: float = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.startup_times[step] = time.perf_counter() - step_start
+
+    # Creates this run's parent range and applies the channel aliases to it
+    def _setup_range(self) -> None:
+        import mclib.phase
+
+        day: str = sy.TimeStamp.now().datetime().strftime("%m/%d")
+        previous = self._timed(
+            "range search", self.client.ranges.search, term=f"{self.name} {day} run"
+        )
+        run: int = len(previous) + 1
+        mclib.phase.parent_range = self._timed(
+            "range create",
+            self.client.ranges.create,
+            name=f"{self.name} {day} run {run}",
+            time_range=sy.TimeRange(sy.TimeStamp.now(), sy.TimeStamp.now()),
+        )
+        # apply aliases
+        self._timed("set alias", mclib.phase.parent_range.set_alias, self.aliases)  # type: ignore
+
+    # Takes control with autosequence, returns the controller and whether every channel is defined
+    def _take_control(self, monitor_actuation: bool) -> tuple[Controller, bool]:
+        ctrl: Controller = self._timed(
+            "acquire control",
+            self.client.control.acquire,
+            name=self.name,
+            write_authorities=100,  # 1 is the default console authority for reference
+            write=self.config.get_vlvs() + ["handoff_channel"],
+            read=self.config.get_sensors() + self.config.get_states(),
+        )
+
+        # Optionally time every valve command until its state channel confirms it
+        if monitor_actuation:
+            ctrl = ActuationMonitor(ctrl)  # type: ignore
+
+        channels: list[str] = self.config.get_sensors() + self.config.get_states()
+        defined: bool = self._timed(
+            "wait until defined",
+            ctrl.wait_until_defined,
+            channels=channels,  # type: ignore
+            timeout=10,
+        )
+        return ctrl, defined
+
+    def log_startup_times(self) -> None:
+        """
+        Logs how long each startup step took, range setup and taking control run in parallel
+        """
+        steps: str = ", ".join(
+            f"{step} {duration * 1e3:.1f} ms"
+            for step, duration in self.startup_times.items()
+            if step != "total"
+        )
+        log(
+            f"Startup took {self.startup_times['total'] * 1e3:.1f} ms ({steps})",
+            color="yellow",
+        )
+
     def synnax_login(self, cluster: str) -> sy.Synnax:
         try:
             client = sy.Synnax(
@@ -154,8 +222,18 @@ class Autosequence:
     def raise_abort(self) -> None:
         self.abort_flag.set()
 
+    def mark_safed(self) -> None:
+        """
+        Called by global_abort once it has commanded the safing valves, so the abort
+        latency can be measured up to that point rather than the end of global_abort
+        """
+        if self._safed_time is None:
+            self._safed_time = time.perf_counter()
+
     def release(self) -> None:
         if not self._has_released:
+            if isinstance(self.ctrl, ActuationMonitor):
+                self.ctrl.report(names=self.aliases)  # type: ignore
             self.ctrl.release()
             log("Autosequence has released control")
             self._has_released = True
@@ -180,118 +258,86 @@ class Autosequence:
                 target=self._interface_func,
             )
             self._interface_thread.start()
-            while True:
-                # Listen for abort signal
-                if self.abort_flag.is_set():
-                    # Kill the command interface thread
-                    if (self._prompt_session is not None) and (
-                        self._prompt_session.app.is_running
-                    ):
-                        self._prompt_session.app.exit()
-                    if (self._interface_thread is not None) and (
-                        self._interface_thread.is_alive()
-                    ):
-                        self._interface_thread.join()
-                    time.sleep(0.1)  # give a small amount of time for thread to close
-                    for phase in self.phases:
-                        phase.abort()
-                        if phase._func_thread.is_alive():
-                            phase.join()
-                    time.sleep(0.1)
-                    if self.global_abort is not None:
-                        self.global_abort(self)
-                    # Kill the background thread if it exists
-                    if (self._background_thread is not None) and (
-                        self._background_thread.is_alive()
-                    ):
-                        self._background_thread.join()
-                    self.release()
-                    log("Autosequence aborted successfully")
-                    return
-                elif self._has_clean_quit.is_set():
-                    if (self._interface_thread is not None) and (
-                        self._interface_thread.is_alive()
-                    ):
-                        self._interface_thread.join()
-                    time.sleep(0.1)
-                    for phase in self.phases:
-                        phase.quit()
-                        if phase._func_thread.is_alive():
-                            phase.join()
-                    if (self._background_thread is not None) and (
-                        self._background_thread.is_alive()
-                    ):
-                        self._background_thread.join()
-                    self.release()
-                    return
-                time.sleep(0.01)  # Yield thread
+            # Block until either abort or quit is signalled
+            # Timed waits, since Ctrl+C can't interrupt an untimed wait on Windows
+            done = lambda: self.abort_flag.is_set() or self._has_clean_quit.is_set()
+            with self._signal:
+                while not self._signal.wait_for(done, timeout=0.1):
+                    pass
+            if self.abort_flag.is_set():
+                self._abort_all()
+            else:
+                self._quit_all()
+
+    def _abort_all(self) -> None:
+        # Fan the abort out to every phase first, everything else can wait
+        for phase in self.phases:
+            phase.abort()
+        signaled_time: float = time.perf_counter()
+
+        # Kill the command interface thread
+        if (self._prompt_session is not None) and (
+            self._prompt_session.app.is_running
+        ):
+            self._prompt_session.app.exit()
+        # Wait for each phase to run its safe function
+        for phase in self.phases:
+            phase.join()
+        phases_safed_time: float = time.perf_counter()
+        if (self._interface_thread is not None) and (
+            self._interface_thread.is_alive()
+        ):
+            self._interface_thread.join()
+        if self.global_abort is not None:
+            self.global_abort(self)
+        # If global_abort didn't report when the valves were commanded, use when it returned
+        self.mark_safed()
+        self._log_abort_latency(signaled_time, phases_safed_time)
+        # Kill the background thread if it exists
+        if (self._background_thread is not None) and (
+            self._background_thread.is_alive()
+        ):
+            self._background_thread.join()
+        for phase in self.phases:
+            phase.close()
+        self.release()
+        log("Autosequence aborted successfully")
+
+    def _quit_all(self) -> None:
+        if (self._interface_thread is not None) and (
+            self._interface_thread.is_alive()
+        ):
+            self._interface_thread.join()
+        for phase in self.phases:
+            phase.quit()
+        for phase in self.phases:
+            phase.close()
+        if (self._background_thread is not None) and (
+            self._background_thread.is_alive()
+        ):
+            self._background_thread.join()
+        self.release()
+
+    def _log_abort_latency(self, signaled_time: float, phases_safed_time: float) -> None:
+        flag_time: float | None = self.abort_flag.set_time
+        if flag_time is None or self._safed_time is None:
+            return
+        log(
+            f"Abort latency: phases signaled +{(signaled_time - flag_time) * 1e3:.2f} ms, "
+            f"phases safed +{(phases_safed_time - flag_time) * 1e3:.2f} ms, "
+            f"valves commanded +{(self._safed_time - flag_time) * 1e3:.2f} ms",
+            color="yellow",
+        )
 
     def _interface_func(self) -> None:
-        # TODO: only allow some state / phase transitions
         try:
-            printf(f"Welcome to the {self.name}!", color="green", bold=True)
-            printf("Valid commands:", color="green", bold=True)
-            printf(" > start <phase>", color="light_green")
-            printf(" > abort <phase>", color="light_green")
-            printf(" > pause <phase>", color="light_green")
-            printf(" > unpause <phase>", color="light_green")
-            printf(" > quit", color="light_green")
-            printf("Valid phases:", color="green", bold=True)
-            for phase in self.phases:
-                printf(f" - {phase.name}", color="light_green")
-
-            completer_phases = [phase.name for phase in self.phases]
-            complete_cmds = {
-                "start": {p: None for p in completer_phases},
-                "pause": {p: None for p in completer_phases},
-                "unpause": {p: None for p in completer_phases},
-                "abort": {p: None for p in completer_phases},
-                "quit": None,
-            }
-            completer = NestedCompleter.from_nested_dict(complete_cmds)
-            completer.ignore_case = True
-            self._prompt_session = PromptSession(
-                completer=completer,
-                complete_while_typing=True,
-                complete_style=CompleteStyle.COLUMN,
-            )
+            self._prompt_session = self._setup_interface()
             while not self.abort_flag.is_set():  # Parse input
                 user_input: str = self._prompt_session.prompt(" > ")
                 if self.abort_flag.is_set():
                     return  # exit if abort flag set during prompt
-                parts: list[str] = (
-                    user_input.strip().lower().split(maxsplit=1)
-                )  # Get command and phase
-                if len(parts) == 0:
-                    for p in self.phases:
-                        if p._wait.is_set():
-                            p.stop_waiting_for_input()
-                    continue
-                command: str = parts[0]
-                if (len(parts) == 1) and (parts[0] != "quit") and (parts[0] != "exit"):
-                    print(" > Please specify a phase name")
-                    continue
-                if (command == "quit") or (command == "exit"):
-                    print(" > Exiting autosequence interface...")
-                    self._has_clean_quit.set()
+                if not self._handle_input(user_input):
                     return
-                phase: Phase | None = self.get_phase(phase_name=parts[1])
-                if phase is None:
-                    print(" > Phase not recognized, please try again")
-                    continue
-                match command:
-                    case "start":
-                        phase.start()
-                    case "abort":
-                        phase.abort()
-                    case "pause":
-                        phase.pause()
-                    case "unpause":
-                        phase.unpause()
-                    case _:
-                        print(" > Unrecognized command, please try again")
-                        continue
-
         except KeyboardInterrupt:
             log("Keyboard interrupt detected, aborting!")
             self.raise_abort()
@@ -299,3 +345,68 @@ class Autosequence:
             log("Keyboard interrupt detected, aborting!")
             self.raise_abort()
         return
+
+    # Prints the welcome message & makes the prompt session for the command interface
+    def _setup_interface(self) -> PromptSession:
+        printf(f"Welcome to the {self.name}!", color="green", bold=True)
+        printf("Valid commands:", color="green", bold=True)
+        printf(" > start <phase>", color="light_green")
+        printf(" > abort <phase>", color="light_green")
+        printf(" > pause <phase>", color="light_green")
+        printf(" > unpause <phase>", color="light_green")
+        printf(" > quit", color="light_green")
+        printf("Valid phases:", color="green", bold=True)
+        for phase in self.phases:
+            printf(f" - {phase.name}", color="light_green")
+
+        completer_phases = [phase.name for phase in self.phases]
+        complete_cmds = {
+            "start": {p: None for p in completer_phases},
+            "pause": {p: None for p in completer_phases},
+            "unpause": {p: None for p in completer_phases},
+            "abort": {p: None for p in completer_phases},
+            "quit": None,
+        }
+        completer = NestedCompleter.from_nested_dict(complete_cmds)
+        completer.ignore_case = True
+        return PromptSession(
+            completer=completer,
+            complete_while_typing=True,
+            complete_style=CompleteStyle.COLUMN,
+        )
+
+    # Handles one line of user input, returns False once the interface should exit
+    def _handle_input(self, user_input: str) -> bool:
+        # TODO: only allow some state / phase transitions
+        parts: list[str] = (
+            user_input.strip().lower().split(maxsplit=1)
+        )  # Get command and phase
+        if len(parts) == 0:
+            for p in self.phases:
+                if p._wait.is_set():
+                    p.stop_waiting_for_input()
+            return True
+        command: str = parts[0]
+        if (len(parts) == 1) and (parts[0] != "quit") and (parts[0] != "exit"):
+            print(" > Please specify a phase name")
+            return True
+        if (command == "quit") or (command == "exit"):
+            print(" > Exiting autosequence interface...")
+            self._has_clean_quit.set()
+            return False
+        phase: Phase | None = self.get_phase(phase_name=parts[1])
+        if phase is None:
+            print(" > Phase not recognized, please try again")
+            return True
+        match command:
+            case "start":
+                phase.start()
+            case "abort":
+                phase.abort()
+            case "pause":
+                phase.pause()
+            case "unpause":
+                phase.unpause()
+            case _:
+                print(" > Unrecognized command, please try again")
+        return True
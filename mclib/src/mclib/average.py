@@ -1,6 +1,17 @@
+from abc import ABC, abstractmethod
+import math
 import statistics
-from typing import Any
+import time
+import warnings
+from typing import Any, Mapping, Sequence
+import numpy as np
 from synnax.control.controller import Controller
+from mclib.logger import log
+
+# ewma_filter works in blocks short enough that the running product of (1 - alpha) stays
+# above e^-EWMA_BLOCK_DECAY, so dividing by it can never overflow
+EWMA_BLOCK_DECAY: float = 50.0
+EWMA_MAX_ALPHA: float = 1.0 - 1e-12  # alpha = 1 (a window of 1) would divide by zero
 
 
 class average_ch:
@@ -42,6 +53,360 @@ class average_ch:
         return self.get()
 
 
+def ewma_filter(
+    samples: np.ndarray, alpha: np.ndarray, state: np.ndarray
+) -> np.ndarray:
+    """
+    Runs the EWMA recursion avg = alpha * x + (1 - alpha) * avg down every column of
+    samples (shape [samples, channels]) at once, updating state (the last average of each
+    channel, NaN if it has no samples yet) in place. Returns the average after every sample.
+    NaN samples are skipped (the average holds), and a channel's first sample initializes it,
+    with NaN output before that, the same as average_ch.
+
+    The recursion is unrolled into a closed form with cumprod / cumsum, so it's a handful
+    of NumPy calls per block of samples instead of a Python loop per sample
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    alpha = np.minimum(np.asarray(alpha, dtype=np.float64), EWMA_MAX_ALPHA)
+    out: np.ndarray = np.full(samples.shape, np.nan)
+    if samples.shape[0] == 0:
+        return out
+    block: int = max(1, int(EWMA_BLOCK_DECAY / -math.log1p(-float(alpha.max()))))
+    for start in range(0, samples.shape[0], block):
+        out[start : start + block] = _ewma_block(
+            samples[start : start + block], alpha, state
+        )
+    return out
+
+
+def _ewma_block(x: np.ndarray, alpha: np.ndarray, state: np.ndarray) -> np.ndarray:
+    valid: np.ndarray = ~np.isnan(x)
+    before_first: np.ndarray | None = None
+
+    # Initialize channels that have no average yet from their first sample
+    empty: np.ndarray = np.isnan(state)
+    if empty.any():
+        has_sample: np.ndarray = valid.any(axis=0)
+        first: np.ndarray = np.where(has_sample, valid.argmax(axis=0), len(x))
+        before_first = (np.arange(len(x))[:, None] < first[None, :]) & empty[None, :]
+        cols: np.ndarray = np.flatnonzero(empty & has_sample)
+        state[cols] = x[first[cols], cols]
+        valid = valid.copy()
+        valid[first[cols], cols] = False  # Already used to initialize
+
+    # avg_j = P_j * (avg_0 + sum_{i <= j} a_i * x_i / P_i), where P_j = prod_{i <= j} (1 - a_i)
+    a: np.ndarray = np.where(valid, alpha[None, :], 0.0)
+    decay: np.ndarray = np.cumprod(1.0 - a, axis=0)
+    weighted: np.ndarray = np.where(valid, a * np.nan_to_num(x), 0.0) / decay
+    out: np.ndarray = decay * (state[None, :] + np.cumsum(weighted, axis=0))
+    if before_first is not None:
+        out[before_first] = np.nan
+    state[:] = np.where(np.isnan(state), np.nan, out[-1])
+    return out
+
+
+def _first_order(w: np.ndarray, pole: np.ndarray, state: np.ndarray) -> np.ndarray:
+    """
+    Runs y[n] = w[n] + pole * y[n - 1] down every column of w at once, with the same
+    blocked closed form as ewma_filter (pole may be complex). Updates state in place
+    """
+    out: np.ndarray = np.empty(w.shape, dtype=np.result_type(w, pole, state))
+    if w.shape[0] == 0:
+        return out
+    smallest: float = max(float(np.abs(pole).min()), 1e-300)
+    block: int = max(1, int(EWMA_BLOCK_DECAY / max(-math.log(smallest), 1e-12)))
+    for start in range(0, w.shape[0], block):
+        chunk: np.ndarray = w[start : start + block]
+        powers: np.ndarray = pole[None, :] ** np.arange(1, len(chunk) + 1)[:, None]
+        # y_j = p^j * (y_0 + sum_{i <= j} w_i / p^i)
+        out[start : start + block] = powers * (
+            state[None, :] + np.cumsum(chunk / powers, axis=0)
+        )
+        state[:] = out[start + len(chunk) - 1]
+    return out
+
+
+def _fill_forward(samples: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """
+    Replaces NaN samples with the channel's previous sample (last for the first rows)
+    """
+    data: np.ndarray = np.vstack([last[None, :], samples])
+    valid: np.ndarray = ~np.isnan(data)
+    rows: np.ndarray = np.where(valid, np.arange(len(data))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return data[rows, np.arange(data.shape[1])[None, :]][1:]
+
+
+class FilterBank(ABC):
+    """
+    Base for vectorized filters over a set of channels: holds one filter state per channel
+    and runs whole [samples, channels] arrays or frames through them at once.
+    Subclasses implement _filter(samples, cols), filtering the given columns in place of
+    their state. NaN samples are skipped, and output is NaN until a channel's first sample
+    """
+
+    channels: list[str]
+    avg: np.ndarray  # Latest output per channel, NaN until a channel gets its first value
+
+    _index: dict[str, int]
+
+    def __init__(self, channels: Sequence[str]):
+        self.channels = list(channels)
+        self._index = {ch: i for i, ch in enumerate(self.channels)}
+        self.avg = np.full(len(self.channels), np.nan)
+
+    @abstractmethod
+    def _filter(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        pass
+
+    def index(self, channel: str) -> int:
+        return self._index[channel]
+
+    def add_samples(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Runs every sample of a [samples, channels] array through the filters (columns in
+        channel order), returns the output after every sample
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(self.channels))
+        return self._run(samples, np.arange(len(self.channels)))
+
+    def _run(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        out: np.ndarray = self._filter(samples, cols)
+        if len(out) > 0:
+            # Hold the previous output through trailing NaNs
+            last: np.ndarray = _fill_forward(out, self.avg[cols])[-1]
+            self.avg[cols] = last
+        return out
+
+    def add_frame(self, frame: Any) -> dict[str, np.ndarray]:
+        """
+        Runs every sample of each channel in a frame (or dict of arrays) through its filter,
+        returns the output series per channel, aligned with the frame's samples
+        Channels missing from the frame are skipped
+        """
+        # Channels on different indexes can have different sample counts, filter each group
+        groups: dict[int, list[int]] = {}
+        series: dict[int, np.ndarray] = {}
+        for i, ch in enumerate(self.channels):
+            if ch not in frame:
+                continue
+            # Synnax's MultiSeries.__array__ doesn't take a dtype, so convert after
+            data: np.ndarray = np.asarray(frame[ch]).astype(np.float64).reshape(-1)
+            series[i] = data
+            groups.setdefault(len(data), []).append(i)
+
+        result: dict[str, np.ndarray] = {}
+        for cols in groups.values():
+            out: np.ndarray = self._run(
+                np.column_stack([series[i] for i in cols]), np.array(cols)
+            )
+            for j, i in enumerate(cols):
+                result[self.channels[i]] = out[:, j]
+        return result
+
+    def get(self, channel: str | None = None) -> float | np.ndarray:
+        if channel is None:
+            return self.avg
+        return float(self.avg[self._index[channel]])
+
+    def reset(self) -> None:
+        self.avg = np.full(len(self.channels), np.nan)
+
+
+class EWMABank(FilterBank):
+    """
+    average_ch for a whole set of channels at once. Holds every channel's average in one
+    array and updates them all with a single vectorized call, either from one value per
+    channel (add / update from a controller) or from a frame's full sample arrays
+    (add_samples / add_frame). Each channel can have its own window, and None / NaN values
+    are skipped
+    """
+
+    alpha: np.ndarray
+
+    def __init__(
+        self,
+        channels: Sequence[str],
+        window: float | int | Sequence[float] | Mapping[str, float],
+    ):
+        super().__init__(channels)
+        if isinstance(window, Mapping):
+            windows = np.array([window[ch] for ch in self.channels], dtype=np.float64)
+        else:
+            windows = np.broadcast_to(
+                np.asarray(window, dtype=np.float64), (len(self.channels),)
+            )
+        # Alpha approximates a window of N items: alpha = 2 / (N + 1)
+        self.alpha = 2.0 / (windows + 1.0)
+
+    def add(self, values: Sequence[float | None] | Mapping[str, float | None]) -> np.ndarray:
+        """
+        Adds one value per channel (in channel order, or keyed by channel name), returns the averages
+        """
+        if isinstance(values, Mapping):
+            row = np.array(
+                [values.get(ch) for ch in self.channels], dtype=np.float64
+            )  # None -> NaN
+        else:
+            row = np.array(values, dtype=np.float64)
+        valid: np.ndarray = ~np.isnan(row)
+        # First value initializes, after that the standard EWMA formula
+        self.avg = np.where(
+            np.isnan(self.avg),
+            row,
+            np.where(valid, row * self.alpha + self.avg * (1 - self.alpha), self.avg),
+        )
+        return self.avg
+
+    def update(self, ctrl: Controller) -> np.ndarray:
+        """
+        Adds the controller's latest value of every channel, returns the averages
+        """
+        return self.add([ctrl.get(ch) for ch in self.channels])
+
+    def _filter(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        state: np.ndarray = self.avg[cols]
+        return ewma_filter(samples, self.alpha[cols], state)
+
+
+class _WindowBank(FilterBank):
+    """
+    Base for filters over the last `window` samples, keeps each channel's previous
+    window - 1 samples so windows span frame (or chunk) boundaries
+    """
+
+    window: int
+
+    _history: np.ndarray  # [window - 1, channels], NaN before a channel's first samples
+
+    def __init__(self, channels: Sequence[str], window: int):
+        super().__init__(channels)
+        self.window = max(1, int(window))
+        self._history = np.full((self.window - 1, len(self.channels)), np.nan)
+
+    def _with_history(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Returns the samples with the previous window - 1 samples in front, and saves the
+        last window - 1 of them for next time
+        """
+        data: np.ndarray = np.vstack([self._history[:, cols], samples])
+        if self.window > 1:
+            self._history[:, cols] = data[-(self.window - 1) :]
+        return data
+
+    def reset(self) -> None:
+        super().reset()
+        self._history[:] = np.nan
+
+
+class BoxcarBank(_WindowBank):
+    """
+    Mean of each channel's last `window` samples (ignoring NaNs), computed with a running
+    sum rather than by summing each window
+    """
+
+    def _filter(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        data: np.ndarray = self._with_history(samples, cols)
+        valid: np.ndarray = ~np.isnan(data)
+        zero: np.ndarray = np.zeros((1, data.shape[1]))
+        sums: np.ndarray = np.cumsum(np.vstack([zero, np.where(valid, data, 0.0)]), axis=0)
+        counts: np.ndarray = np.cumsum(np.vstack([zero, valid]), axis=0)
+        window_sums: np.ndarray = sums[self.window :] - sums[: -self.window]
+        window_counts: np.ndarray = counts[self.window :] - counts[: -self.window]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+class MedianBank(_WindowBank):
+    """
+    Median of each channel's last `window` samples (ignoring NaNs), rejects spikes that
+    a mean would smear out
+    """
+
+    def _filter(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # [samples, channels, window] view of each sample's window
+        windows: np.ndarray = np.lib.stride_tricks.sliding_window_view(
+            self._with_history(samples, cols), self.window, axis=0
+        )
+        if not np.isnan(windows).any():
+            return np.median(windows, axis=-1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN windows give NaN
+            return np.nanmedian(windows, axis=-1)
+
+
+class BiquadBank(FilterBank):
+    """
+    Second order Butterworth low-pass filter per channel (cutoff in Hz at the given sample
+    rate). The biquad is split into two first order recursions, one per pole, which are
+    each run in closed form over whole blocks instead of sample by sample. Channels start
+    at steady state on their first sample, and NaN samples repeat the previous sample
+    """
+
+    b: np.ndarray  # Feedforward coefficients b0, b1, b2
+    poles: np.ndarray  # The two (complex conjugate) poles
+
+    _x: np.ndarray  # [2, channels] last two inputs, x[n - 2] then x[n - 1]
+    _u: np.ndarray  # State of the first recursion, per channel
+    _y: np.ndarray  # State of the second recursion, per channel
+
+    def __init__(self, channels: Sequence[str], cutoff: float, rate: float):
+        super().__init__(channels)
+        if not 0 < cutoff < rate / 2:
+            raise Exception(
+                f"Biquad cutoff ({cutoff} Hz) must be between 0 and half the sample rate ({rate / 2} Hz)"
+            )
+        # RBJ audio EQ cookbook low-pass with Q = 1/sqrt(2)
+        omega: float = 2 * math.pi * cutoff / rate
+        alpha: float = math.sin(omega) / (2 * (1 / math.sqrt(2)))
+        a0: float = 1 + alpha
+        self.b = np.array([1 - math.cos(omega), 2 * (1 - math.cos(omega)), 1 - math.cos(omega)]) / (2 * a0)
+        a: np.ndarray = np.array([1.0, -2 * math.cos(omega) / a0, (1 - alpha) / a0])
+        self.poles = np.roots(a).astype(np.complex128)
+        self._x = np.full((2, len(self.channels)), np.nan)
+        self._u = np.zeros(len(self.channels), dtype=np.complex128)
+        self._y = np.zeros(len(self.channels), dtype=np.complex128)
+
+    def _filter(self, samples: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        p, q = self.poles
+        x_hist: np.ndarray = self._x[:, cols]
+        started: np.ndarray = ~np.isnan(x_hist[1])
+        valid: np.ndarray = ~np.isnan(samples)
+        first: np.ndarray = np.where(valid.any(axis=0), valid.argmax(axis=0), len(samples))
+
+        # Start new channels at steady state on their first sample
+        new: np.ndarray = np.flatnonzero(~started & (first < len(samples)))
+        if len(new) > 0:
+            first_value: np.ndarray = samples[first[new], new]
+            x_hist[:, new] = first_value
+            self._y[cols[new]] = first_value
+            self._u[cols[new]] = first_value * (1 - p)
+
+        x: np.ndarray = _fill_forward(samples, x_hist[1])
+        data: np.ndarray = np.vstack([x_hist, x])
+        self._x[:, cols] = data[-2:]
+        w: np.ndarray = np.nan_to_num(
+            self.b[0] * data[2:] + self.b[1] * data[1:-1] + self.b[2] * data[:-2]
+        )
+
+        # (1 - p z^-1)(1 - q z^-1) y = w  ->  u = w + q u[n - 1],  y = u + p y[n - 1]
+        u_state: np.ndarray = self._u[cols]
+        y_state: np.ndarray = self._y[cols]
+        u: np.ndarray = _first_order(w.astype(np.complex128), np.full(len(cols), q), u_state)
+        y: np.ndarray = _first_order(u, np.full(len(cols), p), y_state)
+        self._u[cols] = u_state
+        self._y[cols] = y_state
+
+        out: np.ndarray = y.real.copy()
+        # NaN before the first sample of channels that hadn't started yet
+        out[(np.arange(len(samples))[:, None] < first[None, :]) & ~started[None, :]] = np.nan
+        return out
+
+    def reset(self) -> None:
+        super().reset()
+        self._x[:] = np.nan
+
+
 def sensor_vote_values(input: list[float], threshold: float) -> float | None:
     """
     Helper function to vote between a list of values.
@@ -76,3 +441,198 @@ def sensor_vote(
         if value is not None:
             values.append(value)
     return sensor_vote_values(values, threshold)
+
+
+class VoteResult:
+    """
+    The outcome of one VoteGroup vote, with which sensors were (not) used
+    """
+
+    value: float | None  # The voted value, None if no sensor had a value
+    median: float | None
+    trusted: list[str]  # Agreed with the median within the threshold, averaged into value
+    rejected: list[str]  # Disagreed with the median by more than the threshold
+    missing: list[str]  # No value received yet
+
+    def __init__(
+        self,
+        value: float | None,
+        median: float | None,
+        trusted: list[str],
+        rejected: list[str],
+        missing: list[str],
+    ):
+        self.value = value
+        self.median = median
+        self.trusted = trusted
+        self.rejected = rejected
+        self.missing = missing
+
+
+class VoteGroup:
+    """
+    sensor_vote for a fixed group of redundant channels, votes with NumPy. Given a client,
+    the channel keys are resolved once and each vote reads the whole group from one read
+    of the controller's state, otherwise each channel is read with ctrl.get.
+    vote_samples / vote_frame vote sample by sample over whole arrays for post-processing.
+    Logs when a sensor starts or stops being rejected and stays that way for hold seconds,
+    so a failing sensor shows up without noise near the threshold flooding the log.
+    Rejections are tracked per threshold, so alternating between thresholds only logs
+    real changes
+    """
+
+    channels: list[str]
+    threshold: float
+    last: VoteResult | None  # Result of the latest vote() / check()
+
+    _keys: list[Any] | None  # Controller state keys of the channels, if given a client
+    _rejected: dict[float, set[str]]  # Channels last logged as rejected (or missing) at each threshold
+    _changed: dict[float, dict[str, float]]  # Channel -> when it first differed from what was logged
+    _report: bool
+    _hold: float
+
+    def __init__(
+        self,
+        channels: Sequence[str],
+        threshold: float,
+        report: bool = True,
+        hold: float = 0.5,
+        client: Any = None,
+    ):
+        self.channels = list(channels)
+        self.threshold = threshold
+        self.last = None
+        self._keys = None
+        if client is not None:
+            # Controller state is keyed by channel key
+            keys: dict[str, Any] = {
+                ch.name: ch.key for ch in client.channels.retrieve(self.channels)
+            }
+            self._keys = [keys[ch] for ch in self.channels]
+        self._rejected = {}
+        self._changed = {}
+        self._report = report
+        self._hold = hold
+
+    def read(self, ctrl: Controller) -> np.ndarray:
+        """
+        Returns every channel's latest value from the controller, NaN if none yet
+        """
+        if self._keys is not None:
+            state: dict = ctrl.state
+            return np.array([state.get(key, np.nan) for key in self._keys], dtype=np.float64)
+        values: list[float] = []
+        for ch in self.channels:
+            value: float | None = ctrl.get(ch)
+            values.append(np.nan if value is None else value)
+        return np.array(values, dtype=np.float64)
+
+    def vote_samples(
+        self, samples: np.ndarray, threshold: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Votes every row of a [samples, channels] array (NaN = no value), the same way as
+        sensor_vote_values. Returns the voted values (NaN where no sensor had a value) and a
+        [samples, channels] mask of the sensors rejected at each sample
+        """
+        if threshold is None:
+            threshold = self.threshold
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(self.channels))
+        valid: np.ndarray = ~np.isnan(samples)
+        any_valid: np.ndarray = valid.any(axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Rows with no values give NaN
+            median: np.ndarray = np.nanmedian(samples, axis=1)
+        trusted: np.ndarray = valid & (np.abs(samples - median[:, None]) <= threshold)
+        counts: np.ndarray = trusted.sum(axis=1)
+        sums: np.ndarray = np.where(trusted, samples, 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # If no sensors agree with the median, fall back to the median
+            values: np.ndarray = np.where(counts > 0, sums / counts, median)
+        values[~any_valid] = np.nan
+        return values, valid & ~trusted
+
+    def vote_frame(
+        self, frame: Any, threshold: float | None = None
+    ) -> tuple[np.ndarray, dict[str, int]]:
+        """
+        Votes sample by sample over a frame (or dict of equal length arrays), returns the
+        voted series and how many samples each channel was rejected for
+        """
+        length: int = max(
+            (len(np.asarray(frame[ch])) for ch in self.channels if ch in frame), default=0
+        )
+        samples: np.ndarray = np.full((length, len(self.channels)), np.nan)
+        for i, ch in enumerate(self.channels):
+            if ch in frame:
+                data: np.ndarray = np.asarray(frame[ch]).astype(np.float64).reshape(-1)
+                samples[: len(data), i] = data
+        values, rejected = self.vote_samples(samples, threshold)
+        counts: np.ndarray = rejected.sum(axis=0)
+        return values, {ch: int(counts[i]) for i, ch in enumerate(self.channels)}
+
+    def check(self, ctrl: Controller, threshold: float | None = None) -> VoteResult:
+        """
+        Votes on the controller's latest values, returns the vote with diagnostics
+        """
+        values: np.ndarray = self.read(ctrl)
+        voted, rejected = self.vote_samples(values[None, :], threshold)
+        missing: np.ndarray = np.isnan(values)
+        median: float | None = None
+        if not missing.all():
+            median = float(np.nanmedian(values))
+        result = VoteResult(
+            value=None if np.isnan(voted[0]) else float(voted[0]),
+            median=median,
+            trusted=[ch for i, ch in enumerate(self.channels) if not (missing[i] or rejected[0, i])],
+            rejected=[ch for i, ch in enumerate(self.channels) if rejected[0, i]],
+            missing=[ch for i, ch in enumerate(self.channels) if missing[i]],
+        )
+        if self._report:
+            self._log_changes(result, self.threshold if threshold is None else threshold)
+        self.last = result
+        return result
+
+    def vote(self, ctrl: Controller, threshold: float | None = None) -> float | None:
+        """
+        Drop-in for sensor_vote(ctrl, channels, threshold), see check() for diagnostics
+        """
+        return self.check(ctrl, threshold).value
+
+    def _log_changes(self, result: VoteResult, threshold: float) -> None:
+        now: float = time.monotonic()
+        previous: set[str] = self._rejected.get(threshold, set())
+        bad: set[str] = set(result.rejected) | set(result.missing)
+        # Only log a change once it has held for every vote over the last hold seconds
+        changed: dict[str, float] = self._changed.setdefault(threshold, {})
+        for ch in list(changed):
+            if (ch in bad) == (ch in previous):
+                del changed[ch]
+        for ch in bad ^ previous:
+            changed.setdefault(ch, now)
+        settled: set[str] = {ch for ch, since in changed.items() if now - since >= self._hold}
+        if not settled:
+            return
+        for ch in settled:
+            del changed[ch]
+
+        for ch in sorted(settled & set(result.missing)):
+            log(f"Sensor vote: rejecting {ch} (no value)", color="red")
+        new_rejected: list[str] = sorted(settled & set(result.rejected))
+        if new_rejected and len(self.channels) - len(result.missing) == 2:
+            # The median of two values is their mean, so both are always rejected together
+            log(
+                f"Sensor vote: {' and '.join(result.rejected)} disagree by more than "
+                f"{threshold}, ambiguous with two sensors so neither is trusted",
+                color="red",
+            )
+        else:
+            for ch in new_rejected:
+                log(
+                    f"Sensor vote: rejecting {ch} (disagrees with median {result.median} "
+                    f"by more than {threshold})",
+                    color="red",
+                )
+        for ch in sorted(settled - bad):
+            log(f"Sensor vote: {ch} agrees again at threshold {threshold}, using it", color="yellow")
+        self._rejected[threshold] = (previous | (settled & bad)) - (settled - bad)
@@ -12,6 +12,7 @@ class Config:
     _yaml_data: dict
 
     vars: dict[str, Any]
+    simulation: dict[str, Any]
     vlvs: dict[str, str]
     pts: dict[str, str]
     tcs: dict[str, str]
@@ -22,6 +23,7 @@ class Config:
         self.pts: dict[str, str] = {}
         self.tcs: dict[str, str] = {}
         self.vars: dict[str, Any] = {}
+        self.simulation: dict[str, Any] = {}
 
         prefix_map: dict[str, str] = {
             "ebox": "gse",
@@ -37,6 +39,7 @@ class Config:
             self._yaml_data: dict = yaml.safe_load(f)
 
         self.vars: dict[str, Any] = self._yaml_data.get("variables", {})
+        self.simulation: dict[str, Any] = self._yaml_data.get("simulation", {})
         mappings_data: dict[Any, Any] = self._yaml_data.get("channel_mappings", {})
 
         for controller_key, prefix in prefix_map.items():
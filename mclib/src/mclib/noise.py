@@ -0,0 +1,115 @@
+import fnmatch
+import numpy as np
+from typing import Any
+from mclib.config import Config
+
+DEFAULT_PT_SIGMA: float = 10.0  # psi
+DEFAULT_TC_SIGMA: float = 2.0  # degrees celsius
+DEFAULT_BLOCK_SIZE: int = 256  # ticks of noise drawn per NumPy call
+
+
+class SensorNoise:
+    """
+    Generates simulated instrument noise for a fixed list of channels, a whole tick at a time
+    Profiles come from the 'noise' part of the 'simulation' config section:
+
+    noise:
+      pt: { sigma: 10 }  # defaults for every PT
+      tc: { sigma: 2 }  # defaults for every TC
+      instruments:  # overrides by config name, glob patterns are allowed
+        Ox_Level_Sensor: { sigma: 0.02, quantization: 0.005 }
+        COPV_PT_*: { sigma: 5, bias: 1.5, drift: 0.1 }
+
+    sigma is gaussian white noise, bias is a constant offset, drift is a random walk
+    (sigma per sqrt(second)), and quantization rounds the final value to that step size
+    """
+
+    channels: list[str]
+    sigma: np.ndarray
+    bias: np.ndarray
+    drift: np.ndarray  # random walk sigma, per sqrt(second)
+    quantization: np.ndarray  # 0 for none
+
+    _rng: np.random.Generator
+    _drift_state: np.ndarray
+    _block: np.ndarray
+    _block_size: int
+    _block_pos: int
+
+    def __init__(
+        self,
+        config: Config,
+        channels: list[str],
+        seed: int | None = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        self.channels = channels
+        self._rng = np.random.default_rng(seed)
+        self._block_size = block_size
+
+        noise_config: dict[str, Any] = config.simulation.get("noise", {})
+        pt_default: dict[str, Any] = {"sigma": DEFAULT_PT_SIGMA} | noise_config.get(
+            "pt", {}
+        )
+        tc_default: dict[str, Any] = {"sigma": DEFAULT_TC_SIGMA} | noise_config.get(
+            "tc", {}
+        )
+        instruments: dict[str, dict] = {
+            pattern.lower(): profile
+            for pattern, profile in noise_config.get("instruments", {}).items()
+        }
+
+        # synnax name -> config name, so profiles can use the names in channel_mappings
+        real_names: dict[str, str] = {
+            value: key for key, value in (config.pts | config.tcs).items()
+        }
+
+        profiles: list[dict[str, Any]] = []
+        for channel in channels:
+            real_name: str = real_names.get(channel, channel)
+            profile: dict[str, Any] = dict(
+                pt_default if channel in config.pts.values() else tc_default
+            )
+            for pattern, override in instruments.items():
+                if fnmatch.fnmatchcase(real_name, pattern) or fnmatch.fnmatchcase(
+                    channel, pattern
+                ):
+                    profile |= override
+            profiles.append(profile)
+
+        self.sigma = np.array([p.get("sigma", 0.0) for p in profiles], dtype=np.float64)
+        self.bias = np.array([p.get("bias", 0.0) for p in profiles], dtype=np.float64)
+        self.drift = np.array([p.get("drift", 0.0) for p in profiles], dtype=np.float64)
+        self.quantization = np.array(
+            [p.get("quantization", 0.0) for p in profiles], dtype=np.float64
+        )
+        self._drift_state = np.zeros(len(channels), dtype=np.float64)
+        self._block_pos = block_size  # draw on first use
+
+    def _next_normals(self) -> np.ndarray:
+        """
+        Returns 2 rows of standard normals (white noise, drift) for one tick,
+        refilling a block of ticks ahead in a single NumPy call when it runs out
+        """
+        if self._block_pos >= self._block_size:
+            self._block = self._rng.standard_normal(
+                (self._block_size, 2, len(self.channels))
+            )
+            self._block_pos = 0
+        normals: np.ndarray = self._block[self._block_pos]
+        self._block_pos += 1
+        return normals
+
+    def apply(self, values: np.ndarray, dt: float) -> np.ndarray:
+        """
+        Returns values (aligned with channels) with one tick of noise applied
+        """
+        normals: np.ndarray = self._next_normals()
+        self._drift_state += self.drift * np.sqrt(dt) * normals[1]
+        noisy: np.ndarray = values + self.bias + self._drift_state + self.sigma * normals[0]
+
+        quantized: np.ndarray = self.quantization > 0
+        if quantized.any():
+            step: np.ndarray = self.quantization[quantized]
+            noisy[quantized] = np.round(noisy[quantized] / step) * step
+        return noisy
@@ -0,0 +1,698 @@
+from __future__ import annotations
+from typing import Any, Callable
+import fnmatch
+import itertools
+import queue
+import threading
+import time
+import uuid
+import numpy as np
+import synnax as sy
+from synnax.control.controller import Processor, WaitUntil
+from mclib.config import Config
+from mclib.system import ArraySystem, System
+from mclib.noise import SensorNoise
+from mclib.sampler import PlantSampler
+
+
+class OfflineChannel:
+    """
+    A channel in an OfflineSynnax, with the fields of sy.Channel that we use
+    """
+
+    key: int
+    name: str
+    data_type: sy.DataType
+    virtual: bool
+    is_index: bool
+    index: int
+
+    def __init__(
+        self,
+        key: int,
+        name: str,
+        data_type: sy.DataType,
+        virtual: bool,
+        is_index: bool,
+        index: int,
+    ):
+        self.key = key
+        self.name = name
+        self.data_type = data_type
+        self.virtual = virtual
+        self.is_index = is_index
+        self.index = key if is_index else index
+
+    def __repr__(self) -> str:
+        return f"OfflineChannel({self.name}, key={self.key})"
+
+
+class OfflineFrame:
+    """
+    A frame of series keyed by channel name, with the parts of sy.Frame that we use
+    """
+
+    channels: list[str]
+    series: list[list]
+
+    def __init__(self, data: dict[str, list]):
+        self.channels = list(data.keys())
+        self.series = list(data.values())
+
+    def __getitem__(self, channel: str) -> list:
+        return self.series[self.channels.index(channel)]
+
+    def __contains__(self, channel: str) -> bool:
+        return channel in self.channels
+
+    def get(self, channel: str, default: Any = None) -> Any:
+        if channel not in self.channels:
+            return default
+        return self[channel]
+
+
+class _Bus:
+    """
+    Routes every written frame to the streamers and controllers subscribed to its channels,
+    synchronously on the writer's thread
+    """
+
+    lock: threading.RLock
+    streamers: list["OfflineStreamer"]
+    receivers: list["OfflineReceiver"]
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.streamers = []
+        self.receivers = []
+
+    def publish(self, data: dict[str, list]) -> None:
+        with self.lock:
+            for streamer in self.streamers:
+                streamer._deliver(data)
+            for receiver in self.receivers:
+                receiver._deliver(data)
+
+
+class OfflineChannels:
+    """
+    Stand-in for client.channels, supports create() and retrieve()
+    """
+
+    _by_name: dict[str, OfflineChannel]
+    _by_key: dict[int, OfflineChannel]
+    _keys: itertools.count
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_key = {}
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(
+        self,
+        name: str,
+        data_type: sy.DataType = sy.DataType.FLOAT32,
+        virtual: bool = False,
+        is_index: bool = False,
+        index: int = 0,
+        retrieve_if_name_exists: bool = False,
+        **kwargs,
+    ) -> OfflineChannel:
+        with self._lock:
+            existing: OfflineChannel | None = self._by_name.get(name)
+            if existing is not None:
+                if retrieve_if_name_exists:
+                    return existing
+                raise Exception(f"Channel with name: '{name}' already exists")
+            channel = OfflineChannel(
+                next(self._keys), name, data_type, virtual, is_index, index
+            )
+            self._by_name[name] = channel
+            self._by_key[channel.key] = channel
+            return channel
+
+    def retrieve(
+        self, channels: str | int | list[str | int]
+    ) -> OfflineChannel | list[OfflineChannel]:
+        """
+        Retrieves a channel by name or key, or a list of them. Names in a list may be glob
+        patterns ("*"), in which case only the matching channels are returned
+        """
+        if not isinstance(channels, list):
+            channel: OfflineChannel | None = (
+                self._by_key.get(channels)
+                if isinstance(channels, int)
+                else self._by_name.get(channels)
+            )
+            if channel is None:
+                raise sy.NotFoundError(f"Channel '{channels}' not found")
+            return channel
+
+        found: list[OfflineChannel] = []
+        for item in channels:
+            if isinstance(item, int):
+                if item in self._by_key:
+                    found.append(self._by_key[item])
+            else:
+                found.extend(
+                    ch for name, ch in self._by_name.items() if fnmatch.fnmatchcase(name, item)
+                )
+        return found
+
+    def name_of(self, channel: str | int) -> str:
+        ch = self.retrieve(channel)
+        return ch.name  # type: ignore
+
+
+class OfflineRange:
+    """
+    A range in an OfflineSynnax, with the parts of sy.Range that we use
+    """
+
+    key: str
+    name: str
+    time_range: sy.TimeRange
+    color: str
+    aliases: dict[int | str, str]
+    children: list["OfflineRange"]
+
+    def __init__(self, name: str, time_range: sy.TimeRange, color: str = "", key: str = ""):
+        self.key = key if key != "" else str(uuid.uuid4())
+        self.name = name
+        self.time_range = time_range
+        self.color = color
+        self.aliases = {}
+        self.children = []
+
+    def set_alias(self, channel: int | str | dict[int | str, str], alias: str = "") -> None:
+        if isinstance(channel, dict):
+            self.aliases.update(channel)
+        else:
+            self.aliases[channel] = alias
+
+    def create_child_range(
+        self, name: str, time_range: sy.TimeRange, color: str = ""
+    ) -> "OfflineRange":
+        child = OfflineRange(name=name, time_range=time_range, color=color)
+        self.children.append(child)
+        return child
+
+
+class OfflineRanges:
+    """
+    Stand-in for client.ranges, supports create(), retrieve(), and search()
+    """
+
+    _ranges: dict[str, OfflineRange]
+
+    def __init__(self):
+        self._ranges = {}
+
+    def create(
+        self,
+        name: str = "",
+        time_range: sy.TimeRange | None = None,
+        key: str | None = None,
+        color: str = "",
+        retrieve_if_name_exists: bool = False,
+        **kwargs,
+    ) -> OfflineRange:
+        if time_range is None:
+            time_range = sy.TimeRange(sy.TimeStamp.now(), sy.TimeStamp.now())
+        if retrieve_if_name_exists:
+            for existing in self._ranges.values():
+                if existing.name == name:
+                    return existing
+        if key is not None and key in self._ranges:  # Same as Synnax, update in place
+            existing: OfflineRange = self._ranges[key]
+            existing.name = name
+            existing.time_range = time_range
+            existing.color = color
+            return existing
+        new_range = OfflineRange(name=name, time_range=time_range, color=color, key=key or "")
+        self._ranges[new_range.key] = new_range
+        return new_range
+
+    def retrieve(self, key: str | None = None, name: str | None = None) -> OfflineRange:
+        for existing in self._ranges.values():
+            if existing.key == key or existing.name == name:
+                return existing
+        raise sy.NotFoundError(f"Range '{key or name}' not found")
+
+    def search(self, term: str) -> list[OfflineRange]:
+        return [r for r in self._ranges.values() if term.lower() in r.name.lower()]
+
+
+class OfflineStreamer:
+    """
+    Stand-in for sy.Streamer, frames are queued as they're written
+    """
+
+    channels: set[str]
+
+    _bus: _Bus
+    _frames: queue.Queue
+
+    def __init__(self, bus: _Bus, channels: list[str]):
+        self.channels = set(channels)
+        self._bus = bus
+        self._frames = queue.Queue()
+        with bus.lock:
+            bus.streamers.append(self)
+
+    def _deliver(self, data: dict[str, list]) -> None:
+        subset: dict[str, list] = {ch: v for ch, v in data.items() if ch in self.channels}
+        if len(subset) > 0:
+            self._frames.put(OfflineFrame(subset))
+
+    def read(self, timeout: float | None = None) -> OfflineFrame | None:
+        try:
+            if timeout == 0:
+                return self._frames.get_nowait()
+            return self._frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> OfflineFrame:
+        return self._frames.get()
+
+    def close(self) -> None:
+        with self._bus.lock:
+            if self in self._bus.streamers:
+                self._bus.streamers.remove(self)
+
+    def __enter__(self) -> "OfflineStreamer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class OfflineWriter:
+    """
+    Stand-in for sy.Writer, every write is immediately streamed to subscribers
+    """
+
+    channels: set[str]
+
+    _client: "OfflineSynnax"
+
+    def __init__(self, client: "OfflineSynnax", channels: list[str]):
+        self.channels = set(channels)
+        self._client = client
+
+    def write(self, data: Any, value: Any = None) -> bool:
+        if not isinstance(data, dict):  # write(channel, value)
+            data = {data: value}
+        self._client._publish(data)
+        return True
+
+    def commit(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "OfflineWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class OfflineReceiver:
+    """
+    Stand-in for the controller's receiver thread. Keeps the latest value of every read
+    channel, keyed by channel key like Synnax, and runs the registered processors
+    (e.g. wait_until conditions) once per frame
+    """
+
+    channels: set[str]
+    state: dict[int, Any]
+    processors: set[Processor]
+    processor_lock: threading.Lock
+    controller: "OfflineController"
+
+    _keys: dict[str, int]  # channel name -> key, filled in as channels are first written
+
+    def __init__(self, channels: list[str], controller: "OfflineController"):
+        self.channels = set(channels)
+        self.state = {}
+        self._keys = {}
+        self.processors = set()
+        self.processor_lock = threading.Lock()
+        self.controller = controller
+
+    def add_processor(self, processor: Processor) -> None:
+        with self.processor_lock:
+            self.processors.add(processor)
+
+    def remove_processor(self, processor: Processor) -> None:
+        with self.processor_lock:
+            self.processors.remove(processor)
+
+    def _deliver(self, data: dict[str, list]) -> None:
+        updated: bool = False
+        for channel, series in data.items():
+            if channel in self.channels:
+                key: int | None = self._keys.get(channel)
+                if key is None:
+                    key = self._keys[channel] = self.controller._key_of(channel)
+                self.state[key] = series[-1]
+                updated = True
+        if updated:
+            self._process()
+
+    def _process(self) -> None:
+        with self.processor_lock:
+            for p in list(self.processors):
+                p.process(self.controller)
+
+
+class OfflineController:
+    """
+    Stand-in for synnax's Controller: get/set/[]/wait_until/wait_until_defined/release
+    State is keyed by channel key, the same as Synnax
+    """
+
+    name: str
+    write: list[str]
+    read: list[str]
+
+    _client: "OfflineSynnax"
+    _receiver: OfflineReceiver
+
+    def __init__(
+        self, client: "OfflineSynnax", name: str, write: list[str], read: list[str]
+    ):
+        self.name = name
+        self.write = write
+        self.read = read
+        self._client = client
+        self._receiver = OfflineReceiver(read, self)
+        with client._bus.lock:
+            client._bus.receivers.append(self._receiver)
+
+    @property
+    def state(self) -> dict[int, Any]:
+        return self._receiver.state
+
+    def _key_of(self, channel: str | int) -> int:
+        retrieved: OfflineChannel = self._client.channels.retrieve(channel)  # type: ignore
+        return retrieved.key
+
+    def set(self, channel: str | int | dict[str | int, Any], value: Any = None) -> None:
+        if not isinstance(channel, dict):
+            channel = {channel: value}
+        data: dict[str, Any] = {}
+        now: sy.TimeStamp = sy.TimeStamp.now()
+        for ch, ch_value in channel.items():
+            retrieved: OfflineChannel = self._client.channels.retrieve(ch)  # type: ignore
+            data[retrieved.name] = ch_value
+            if not retrieved.virtual:
+                data[self._client.channels.name_of(retrieved.index)] = now
+        self._client._publish(data)
+
+    def __setitem__(self, channel: str | int, value: Any) -> None:
+        self.set(channel, value)
+
+    def get(self, channel: str | int, default: Any = None) -> Any:
+        return self._receiver.state.get(self._key_of(channel), default)
+
+    def __getitem__(self, channel: str | int) -> Any:
+        return self._receiver.state[self._key_of(channel)]
+
+    def wait_until(
+        self, cond: Callable[["OfflineController"], bool], timeout: float | None = None
+    ) -> bool:
+        return self._internal_wait_until(cond, timeout)
+
+    def wait_while(
+        self, cond: Callable[["OfflineController"], bool], timeout: float | None = None
+    ) -> bool:
+        return self._internal_wait_until(cond, timeout, reverse=True)
+
+    def _internal_wait_until(
+        self,
+        cond: Callable[["OfflineController"], bool],
+        timeout: float | None = None,
+        reverse: bool = False,
+    ) -> bool:
+        processor = WaitUntil(cond, reverse)  # type: ignore
+        try:
+            self._receiver.add_processor(processor)
+            ok: bool = processor.event.wait(timeout=timeout)
+        finally:
+            self._receiver.remove_processor(processor)
+        if processor.exc:
+            raise processor.exc
+        return ok
+
+    def wait_until_defined(
+        self, channels: str | int | list[str | int], timeout: float | None = None
+    ) -> bool:
+        if not isinstance(channels, list):
+            channels = [channels]
+        keys: list[int] = [self._key_of(ch) for ch in channels]
+        if all(key in self.state for key in keys):
+            return True
+        return self.wait_until(lambda c: all(key in c.state for key in keys), timeout)
+
+    def sleep(self, duration: float) -> None:
+        time.sleep(duration)
+
+    def release(self) -> None:
+        with self._client._bus.lock:
+            if self._receiver in self._client._bus.receivers:
+                self._client._bus.receivers.remove(self._receiver)
+
+    def __enter__(self) -> "OfflineController":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+class OfflineControl:
+    """
+    Stand-in for client.control, supports acquire()
+    """
+
+    _client: "OfflineSynnax"
+
+    def __init__(self, client: "OfflineSynnax"):
+        self._client = client
+
+    def acquire(
+        self,
+        name: str,
+        write: list[str] | None = None,
+        read: list[str] | None = None,
+        write_authorities: int | list[int] = 255,
+        **kwargs,
+    ) -> OfflineController:
+        return OfflineController(self._client, name, write or [], read or [])
+
+
+class OfflineSynnax:
+    """
+    An in-process, in-memory stand-in for the subset of sy.Synnax that our scripts use:
+    channels.create/retrieve, open_streamer/open_writer, control.acquire, and ranges.
+    Writes are delivered synchronously to streamers and controllers, so an autosequence and
+    a simulated plant (see OfflinePlant) can run end to end in one process with no network
+    """
+
+    channels: OfflineChannels
+    ranges: OfflineRanges
+    control: OfflineControl
+
+    _bus: _Bus
+
+    def __init__(self):
+        self.channels = OfflineChannels()
+        self.ranges = OfflineRanges()
+        self.control = OfflineControl(self)
+        self._bus = _Bus()
+
+    def _publish(self, data: dict) -> None:
+        frame: dict[str, list] = {}
+        for channel, value in data.items():
+            name: str = self.channels.name_of(channel)
+            if isinstance(value, sy.Series):
+                value = value.to_numpy()
+            if isinstance(value, np.ndarray):
+                frame[name] = value.tolist()
+            elif isinstance(value, (list, tuple)):
+                frame[name] = list(value)
+            else:
+                frame[name] = [value]
+        self._bus.publish(frame)
+
+    def open_streamer(self, channels: str | list[str], **kwargs) -> OfflineStreamer:
+        if not isinstance(channels, list):
+            channels = [channels]
+        return OfflineStreamer(self._bus, [self.channels.name_of(ch) for ch in channels])
+
+    def open_writer(
+        self, start: sy.TimeStamp, channels: str | list[str], **kwargs
+    ) -> OfflineWriter:
+        if not isinstance(channels, list):
+            channels = [channels]
+        return OfflineWriter(self, [self.channels.name_of(ch) for ch in channels])
+
+    def close(self) -> None:
+        pass
+
+
+class OfflinePlant:
+    """
+    Drives a simulated System from an OfflineSynnax, in place of simulation.py:
+    creates the channels in config, applies valve commands, and writes valve states and
+    sensor values every tick. The config needs a 'simulation' section (see mclib.system)
+
+    Use start()/stop() to run it on a background thread at `frequency`, or step() to
+    advance it one tick at a time from the caller for fully deterministic runs
+
+    Channels of an extra_config (e.g. the autosequence's) that the plant doesn't model are
+    created too. Their valves just echo each command back on their state channel, and their
+    sensors read 0
+    """
+
+    config: Config
+    system: System | ArraySystem
+    frequency: float
+    noise: SensorNoise | None
+
+    _client: OfflineSynnax
+    _streamer: OfflineStreamer
+    _writer: OfflineWriter
+    _thread: threading.Thread | None
+    _stop: threading.Event
+    _sampler: PlantSampler
+    _echo_states: dict[str, int]  # unmodeled valve -> energized
+    _unmodeled_sensors: list[str]
+
+    def __init__(
+        self,
+        client: OfflineSynnax,
+        config: Config,
+        system: System | ArraySystem | None = None,
+        frequency: float = 50,
+        noise: SensorNoise | None = None,
+        extra_config: Config | None = None,
+    ):
+        self.config = config
+        self.system = system if system is not None else System(config)
+        self.frequency = frequency
+        self.noise = noise
+        self._client = client
+        self._thread = None
+        self._stop = threading.Event()
+
+        valves: list[str] = config.get_vlvs()
+        sensors: list[str] = config.get_sensors()
+        self._echo_states = {}
+        self._unmodeled_sensors = []
+        if extra_config is not None:
+            for valve in extra_config.get_vlvs():
+                if valve not in valves:
+                    self._echo_states[valve] = 0
+            for sensor in extra_config.get_sensors():
+                if sensor not in sensors:
+                    self._unmodeled_sensors.append(sensor)
+        valves = valves + list(self._echo_states.keys())
+        states: list[str] = [valve.replace("vlv", "state") for valve in valves]
+        sensors = sensors + self._unmodeled_sensors
+
+        time_channel: OfflineChannel = client.channels.create(
+            name="time",
+            data_type=sy.DataType.TIMESTAMP,
+            is_index=True,
+            retrieve_if_name_exists=True,
+        )
+        for valve in valves + ["handoff_channel"]:
+            client.channels.create(
+                name=valve,
+                data_type=sy.DataType.INT8,
+                virtual=True,
+                retrieve_if_name_exists=True,
+            )
+        for state in states:
+            client.channels.create(
+                name=state,
+                data_type=sy.DataType.INT8,
+                index=time_channel.key,
+                retrieve_if_name_exists=True,
+            )
+        for sensor in sensors:
+            client.channels.create(
+                name=sensor,
+                data_type=sy.DataType.FLOAT32,
+                index=time_channel.key,
+                retrieve_if_name_exists=True,
+            )
+
+        self._streamer = client.open_streamer(valves)
+        self._writer = client.open_writer(
+            start=sy.TimeStamp.now(), channels=["time"] + states + sensors
+        )
+        self._sampler = PlantSampler(config, self.system, noise)
+
+    def step(self, dt: float | None = None) -> None:
+        """
+        Applies pending valve commands, writes one frame of states and sensors,
+        then advances the plant by dt (one tick at `frequency` by default)
+        """
+        if dt is None:
+            dt = 1.0 / self.frequency
+        while True:
+            fr: OfflineFrame | None = self._streamer.read(timeout=0)
+            if fr is None:
+                break
+            for channel in fr.channels:
+                cmd: int = 1 if fr[channel][-1] == True else 0
+                if channel in self._echo_states:
+                    self._echo_states[channel] = cmd
+                else:
+                    self.system.set_valve(channel, cmd)
+
+        data: dict[str, Any] = {"time": sy.TimeStamp.now()}
+        data.update(self._sampler.sample(dt))
+
+        for valve, energized in self._echo_states.items():
+            data[valve.replace("vlv", "state")] = energized
+        for sensor in self._unmodeled_sensors:
+            data[sensor] = 0.0
+
+        self._writer.write(data)
+        self.system.update(dt)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            name="Offline Plant", target=self._run, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        period: float = 1.0 / self.frequency
+        next_tick: float = time.perf_counter()
+        while not self._stop.is_set():
+            self.step(period)
+            next_tick += period
+            remaining: float = next_tick - time.perf_counter()
+            if remaining > 0:
+                self._stop.wait(remaining)
+            else:
+                next_tick = time.perf_counter()  # Fell behind, don't try to catch up
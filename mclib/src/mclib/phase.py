@@ -7,6 +7,7 @@ from synnax.control.controller import Controller
 from mclib.config import Config
 from mclib.logger import log
 from mclib.average import average_ch, sensor_vote
+from mclib.utils import FRAME_POLL_PERIOD, add_frame_processor, remove_frame_processor
 
 if TYPE_CHECKING:
     from mclib.autosequence import Autosequence
@@ -23,6 +24,68 @@ class SequenceExited(Exception):
     pass
 
 
+class SignalEvent(threading.Event):
+    """
+    A threading.Event that also wakes everything waiting on a shared Condition when set,
+    so one thread can block on several events at once. Remembers when it was set
+    """
+
+    set_time: float | None  # time.perf_counter() of the first set() since clear()
+    _condition: threading.Condition
+
+    def __init__(self, condition: threading.Condition):
+        super().__init__()
+        self._condition = condition
+        self.set_time = None
+
+    def set(self) -> None:
+        with self._condition:
+            if not self.is_set():
+                self.set_time = time.perf_counter()
+            super().set()
+            self._condition.notify_all()
+
+    def clear(self) -> None:
+        with self._condition:
+            super().clear()
+            self.set_time = None
+            self._condition.notify_all()
+
+
+class _FrameCondition:
+    """
+    Controller processor that evaluates a wait_until condition exactly once per incoming
+    frame (on the controller's receiver thread), and wakes the waiting phase once it's met
+    """
+
+    met: bool
+    met_time: float | None  # time.perf_counter() when the condition was met
+    exc: Exception | None  # raised by the condition, re-raised on the phase thread
+    _cond: Callable[[Controller], bool]
+    _condition: threading.Condition
+
+    def __init__(self, cond: Callable[[Controller], bool], condition: threading.Condition):
+        self.met = False
+        self.met_time = None
+        self.exc = None
+        self._cond = cond
+        self._condition = condition
+
+    def process(self, state: Controller) -> None:
+        if self.met:
+            return
+        try:
+            result: bool = self._cond(state)
+        except Exception as e:
+            self.exc = e
+            result = True
+        if result:
+            with self._condition:
+                self.met = True
+                self.met_time = time.perf_counter()
+                self._condition.notify_all()
+
+
 class Phase:
     name: str
 
@@ -32,15 +95,20 @@ class Phase:
     auto: "Autosequence"
 
     phase_start_time: sy.TimeStamp | None = None
+    runs: int  # Number of times the phase has been started
 
-    _abort: threading.Event  # Thread-safe flag
-    _quit: threading.Event  # Thread-safe flag
-    _pause: threading.Event  # Thread-safe flag
-    _wait: threading.Event  # Thread-safe flag for waiting for input
-    _stop_wait: threading.Event  # Thread-safe flag for stopping wait for input
+    _signal: threading.Condition  # Notified whenever any of the flags below change
+    _abort: SignalEvent  # Thread-safe flag
+    _quit: SignalEvent  # Thread-safe flag
+    _pause: SignalEvent  # Thread-safe flag
+    _wait: SignalEvent  # Thread-safe flag for waiting for input
 
-    _func_thread: threading.Thread  # Thread wrapper
+    _func_thread: threading.Thread | None  # Persistent worker, created on the first start()
+    _main_func: Callable
     _safe_func: Callable | None = None  # Optional safe function to run on abort
+    _running: bool  # A run has been requested and hasn't finished yet
+    _run_requested: bool  # The worker should start a run
+    _closed: bool  # The worker should exit
 
     _refresh_rate: int  # Hz
     _refresh_period: float
@@ -64,25 +132,32 @@ class Phase:
         self._refresh_rate: int = refresh_rate
         self._refresh_period: float = 1.0 / (2.0 * self._refresh_rate)
 
+        self._main_func = main_func
         self._safe_func: Callable | None = safe_func
-        self._func_thread = threading.Thread(
-            name=self.name,
-            target=self._func_wrapper,
-            args=(main_func,),
-        )
+        self._func_thread = None
+        self._running = False
+        self._run_requested = False
+        self._closed = False
+        self.runs = 0
+
+        self._signal = threading.Condition()
 
-        self._pause = threading.Event()
+        self._pause = SignalEvent(self._signal)
         self._pause.clear()  # Make sure flag is cleared initially
 
-        self._abort = threading.Event()
+        self._abort = SignalEvent(self._signal)
         self._abort.clear()  # Make sure flag is cleared initially
 
-        self._wait = threading.Event()
+        self._wait = SignalEvent(self._signal)
         self._wait.clear()  # Make sure flag is cleared initially
 
-        self._quit = threading.Event()
+        self._quit = SignalEvent(self._signal)
         self._quit.clear()  # Make sure flag is cleared initially
 
+    # True if the phase thread should stop whatever it is waiting on and check signals
+    def _interrupted(self) -> bool:
+        return self._abort.is_set() or self._quit.is_set() or self._pause.is_set()
+
     # Checks for abort or pause signals. Blocks if paused
     def _check_signals(self) -> None:
         if self._abort.is_set():
@@ -92,48 +167,73 @@ class Phase:
             if self._safe_func is not None:
                 self._safe_func(self)
 
-            while self._pause.is_set():
-                if self._abort.is_set():
-                    raise SequenceAborted("Sequence Aborted during pause")
-                if self._quit.is_set():
-                    raise SequenceExited()
-                time.sleep(self._refresh_period)  # Sleep and yield thread
+            # Block until unpaused, aborted, or quit
+            with self._signal:
+                self._signal.wait_for(
+                    lambda: not self._pause.is_set()
+                    or self._abort.is_set()
+                    or self._quit.is_set()
+                )
+            if self._abort.is_set():
+                raise SequenceAborted("Sequence Aborted during pause")
 
         if self._quit.is_set():
             raise SequenceExited()
 
     # Sleep function that should be used inside of the control sequence
-    # Allows for thread aborting and pausing with _check_signals
+    # Allows for thread aborting and pausing with _check_signals, waking immediately on either
     # This should be used instead of time.sleep() at all times when thread yielding is safe
     def sleep(self, duration: float) -> None:
-        end_time: float = time.time() + duration
+        end_time: float = time.monotonic() + duration
         while True:
             self._check_signals()
-            remaining: float = end_time - time.time()
+            remaining: float = end_time - time.monotonic()
             if remaining <= 0:
                 return
-            time.sleep(min(self._refresh_period, remaining))  # Sleep and yield thread
+            with self._signal:
+                self._signal.wait_for(self._interrupted, timeout=remaining)
 
     # Similar to ctrl.wait_until() but allows yielding, similar to phase.sleep()
+    # The condition is checked once against the current state, then exactly once per new
+    # frame the controller receives, and the wait wakes immediately on abort, pause, or quit
     def wait_until(
         self, cond: Callable[[Controller], bool], timeout: float | None = None
     ) -> bool:
-        start_time: float = time.time()
-        while True:
-            self._check_signals()
+        end_time: float | None = None
+        if timeout is not None:
+            end_time = time.monotonic() + timeout
 
-            # Calculate slice timeout
-            slice_time: float = self._refresh_period
-            if timeout is not None:
-                elapsed: float = time.time() - start_time
-                remaining: float = timeout - elapsed
-                if remaining <= 0:
-                    return False
-                slice_time: float = min(slice_time, remaining)
+        self._check_signals()
+        if cond(self.ctrl):
+            return True
 
-            # Use the synnax controller to wait for this slice
-            if self.ctrl.wait_until(cond, timeout=slice_time):
-                return True
+        frame_cond = _FrameCondition(cond, self._signal)
+        per_frame: bool = add_frame_processor(self.ctrl, frame_cond)
+        try:
+            while True:
+                self._check_signals()
+                if not per_frame:  # No frame callbacks, check the condition every poll
+                    frame_cond.process(self.ctrl)
+                remaining: float | None = None
+                if end_time is not None:
+                    remaining = end_time - time.monotonic()
+                with self._signal:
+                    if frame_cond.met:
+                        break
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    if not per_frame:
+                        remaining = min(remaining or FRAME_POLL_PERIOD, FRAME_POLL_PERIOD)
+                    self._signal.wait_for(
+                        lambda: frame_cond.met or self._interrupted(),
+                        timeout=remaining,
+                    )
+        finally:
+            if per_frame:
+                remove_frame_processor(self.ctrl, frame_cond)
+        if frame_cond.exc is not None:
+            raise frame_cond.exc
+        return True
 
     def avg_and_vote_for(
         self,
@@ -162,6 +262,12 @@ class Phase:
         """
         log(msg=msg, color=color, bold=bold, phase_name=self.name)
 
+    # Name of the child range for the current run, later runs get numbered
+    def _range_name(self) -> str:
+        if self.runs <= 1:
+            return self.name
+        return f"{self.name} run {self.runs}"
+
     # A function wrapper to be able to do threading stuff and abort handling
     def _func_wrapper(self, main_func: Callable) -> None:
         try:
@@ -172,22 +278,70 @@ class Phase:
         finally:
             if parent_range is not None:
                 parent_range.create_child_range(
-                    name=self.name,
+                    name=self._range_name(),
                     time_range=sy.TimeRange(self.phase_start_time, sy.TimeStamp.now()),
                     color="#000034",
                 )
 
+    # The persistent worker thread, runs the phase every time it is started until closed
+    def _worker(self) -> None:
+        while True:
+            with self._signal:
+                self._signal.wait_for(lambda: self._run_requested or self._closed)
+                if not self._run_requested:
+                    return
+                self._run_requested = False
+            try:
+                self._func_wrapper(self._main_func)
+            finally:
+                with self._signal:
+                    self._running = False
+                    self._signal.notify_all()
+
+    # Starts the phase, or restarts it if a previous run has finished (e.g. after an abort)
     def start(self) -> None:
-        if self._func_thread.ident is None:
-            # Record the phase start time before starting the worker thread to avoid
+        with self._signal:
+            if self._closed:
+                log(f"Phase {self.name} can no longer be started")
+                return
+            if self._running:
+                log(f"Phase {self.name} already running")
+                return
+            # Re-arm, flags from the previous run would stop this one immediately
+            self._abort.clear()
+            self._quit.clear()
+            self._pause.clear()
+            self._wait.clear()
+            self.runs += 1
+            if self.runs > 1:
+                log(f"Restarting phase {self.name} (run {self.runs})")
+            # Record the phase start time before waking the worker thread to avoid
             # a race where the thread's finally block runs before this is set.
             self.phase_start_time = sy.TimeStamp.now()
+            self._running = True
+            self._run_requested = True
+            self._signal.notify_all()
+        if self._func_thread is None:
+            self._func_thread = threading.Thread(
+                name=self.name, target=self._worker, daemon=True
+            )
             self._func_thread.start()
-        else:
-            log(f"Phase {self.name} already started")
 
+    def is_running(self) -> bool:
+        return self._running
+
+    # Blocks until the current run (if any) has finished
     def join(self) -> None:
-        self._func_thread.join()
+        with self._signal:
+            self._signal.wait_for(lambda: not self._running)
+
+    # Stops the worker thread once the current run (if any) has finished
+    def close(self) -> None:
+        with self._signal:
+            self._closed = True
+            self._signal.notify_all()
+        if self._func_thread is not None:
+            self._func_thread.join()
 
     def abort(self) -> None:
         self._abort.set()
@@ -201,9 +355,17 @@ class Phase:
     def unpause(self) -> None:
         self._pause.clear()
 
-    def wait_for_input(self) -> None:
+    # Waits for the operator to hit enter in the command interface
+    # With block=True, returns once they have (waking immediately on abort, pause, or quit)
+    def wait_for_input(self, block: bool = False) -> None:
         self._wait.set()
         self._check_signals()
+        while block and self._wait.is_set():
+            with self._signal:
+                self._signal.wait_for(
+                    lambda: not self._wait.is_set() or self._interrupted()
+                )
+            self._check_signals()
 
     def stop_waiting_for_input(self) -> None:
         self._wait.clear()
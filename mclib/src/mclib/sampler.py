@@ -0,0 +1,74 @@
+from typing import Any
+import numpy as np
+from mclib.config import Config
+from mclib.noise import SensorNoise
+from mclib.system import ArraySystem, State, System
+
+
+class PlantSampler:
+    """
+    Reads the valve states and sensor values (with noise if given) out of a simulated
+    System or ArraySystem, the way the DAQ would report them. Shared by simulation.py and
+    OfflinePlant, so both write the same frames
+
+    states are aligned with config.get_states(), sensors are every PT followed by every TC
+    """
+
+    config: Config
+    system: System | ArraySystem
+    noise: SensorNoise | None
+    states: list[str]
+    sensors: list[str]
+
+    _valves: list[str]  # valve channel of each state channel
+    _normally_closed: list[bool]
+    _num_pts: int
+
+    def __init__(
+        self,
+        config: Config,
+        system: System | ArraySystem,
+        noise: SensorNoise | None = None,
+    ):
+        self.config = config
+        self.system = system
+        self.noise = noise
+        self.states = config.get_states()
+        self.sensors = config.get_pts() + config.get_tcs()
+        if noise is not None and noise.channels != self.sensors:
+            raise Exception(
+                "SensorNoise channels must be every PT followed by every TC to sample with it"
+            )
+
+        self._valves = [state_ch.replace("state", "vlv") for state_ch in self.states]
+        self._normally_closed = [config.is_vlv_nc(valve) for valve in self._valves]
+        self._num_pts = len(config.pts)
+
+    def sample_arrays(self, dt: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (states, sensors) as arrays, states as int8 1/0 for energized/de-energized
+        dt is the time since the last sample, for the noise's drift
+        """
+        states: np.ndarray = np.empty(len(self.states), dtype=np.int8)
+        for i, valve_name in enumerate(self._valves):
+            is_open: bool = self.system.get_valve_state(valve_name) == State.OPEN
+            # Account for normally open valves
+            states[i] = 1 if is_open == self._normally_closed[i] else 0
+
+        pressures, temperatures = self.system.read_all_sensors(self.sensors)
+        sensors: np.ndarray = np.concatenate(
+            (pressures[: self._num_pts], temperatures[self._num_pts :])
+        )
+        if self.noise is not None:
+            # one NumPy draw per tick (or per block of ticks)
+            sensors = self.noise.apply(sensors, dt)
+        return states, sensors
+
+    def sample(self, dt: float) -> dict[str, Any]:
+        """
+        Same as sample_arrays, but as a {channel: value} dict
+        """
+        states, sensors = self.sample_arrays(dt)
+        data: dict[str, Any] = dict(zip(self.states, states.tolist()))
+        data.update(zip(self.sensors, sensors.tolist()))
+        return data
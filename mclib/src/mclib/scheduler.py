@@ -0,0 +1,118 @@
+from typing import Callable
+import time
+
+DEFAULT_SPIN: float = 0.001  # seconds to busy-wait before each deadline
+
+
+class TimedAction:
+    """
+    An action to fire at a planned time (seconds after the scheduler's start)
+    """
+
+    name: str
+    at: float
+    action: Callable[[], bool | None]
+    record: bool  # Should the commanded-vs-planned skew be recorded
+    after: Callable[[], None] | None  # Follow-up (e.g. logging) once the time's actions fired
+
+    def __init__(
+        self,
+        name: str,
+        at: float,
+        action: Callable[[], bool | None],
+        record: bool = True,
+        after: Callable[[], None] | None = None,
+    ):
+        self.name = name
+        self.at = at
+        self.action = action
+        self.record = record
+        self.after = after
+
+
+class Scheduler:
+    """
+    Fires ordered, timed actions (e.g. valve commands) against precise deadlines
+    Sleeps until just before each deadline with `sleep` (pass phase.sleep so aborts still
+    wake it immediately), then spins for the final `spin` seconds. Actions planned for the
+    same time fire in the order they were added, and their `after` follow-ups only run once
+    all of them have fired, so slow work like logging can't delay a tied action. If an
+    action returns False, the rest of the schedule is cancelled.
+
+    The skew (commanded minus planned time, in seconds) of each recorded action is kept in
+    `skews` as (name, skew)
+    """
+
+    actions: list[TimedAction]
+    skews: list[tuple[str, float]]
+    start: float | None  # time.perf_counter() the schedule started at
+
+    _sleep: Callable[[float], None]
+    _spin: float
+
+    def __init__(
+        self,
+        sleep: Callable[[float], None] = time.sleep,
+        spin: float = DEFAULT_SPIN,
+    ):
+        self.actions = []
+        self.skews = []
+        self.start = None
+        self._sleep = sleep
+        self._spin = spin
+
+    def add(
+        self,
+        name: str,
+        at: float,
+        action: Callable[[], bool | None],
+        record: bool = True,
+        after: Callable[[], None] | None = None,
+    ) -> None:
+        self.actions.append(
+            TimedAction(name=name, at=at, action=action, record=record, after=after)
+        )
+
+    def wait_until(self, deadline: float) -> None:
+        """
+        Sleeps until deadline (a time.perf_counter() value), spinning for the last part
+        """
+        remaining: float = deadline - time.perf_counter() - self._spin
+        if remaining > 0:
+            self._sleep(remaining)
+        self._sleep(0)  # Let sleep check for aborts even if we're already late
+        while time.perf_counter() < deadline:
+            pass
+
+    def run(self, start: float | None = None) -> bool:
+        """
+        Runs every action at start + action.at, start defaults to now
+        Returns False if an action cancelled the schedule
+        """
+        self.start = start if start is not None else time.perf_counter()
+        self.skews = []
+        # sorted() is stable, so ties keep the order they were added in
+        ordered: list[TimedAction] = sorted(self.actions, key=lambda a: a.at)
+        i: int = 0
+        while i < len(ordered):
+            planned: float = self.start + ordered[i].at
+            self.wait_until(planned)
+            fired: list[TimedAction] = []
+            cancelled: bool = False
+            while i < len(ordered) and self.start + ordered[i].at == planned:
+                timed: TimedAction = ordered[i]
+                i += 1
+                commanded: float = time.perf_counter()
+                result: bool | None = timed.action()
+                if timed.record:
+                    self.skews.append((timed.name, commanded - planned))
+                fired.append(timed)
+                if result is False:
+                    cancelled = True
+                    break
+            for timed in fired:
+                if timed.after is not None:
+                    timed.after()
+            if cancelled:
+                return False
+        return True
@@ -1,5 +1,6 @@
 from enum import Enum, auto
-from typing import List
+import numpy as np
+from typing import Callable, List
 from mclib.config import Config
 class State(Enum):
     OPEN = auto()
@@ -7,8 +8,11 @@ class State(Enum):
 
 
 AMBIENT_TEMP: float = 22.0  # degrees celsius
-STD_BOTTLE_VOLUME: float = 42.2  # Liters
-COPV_VOLUME: float = 31.3  # Liters
+DEFAULT_CV: float = 0.02  # cv of valves not given one in the config
+REFERENCE_RATE: float = 50.0  # Hz, a cv is the fraction of p_diff moved per tick at this rate
+INTEGRATORS: tuple[str, ...] = ("exponential", "rk45", "euler")
+DEFAULT_INTEGRATOR: str = "exponential"
+ATMOSPHERE: str = "atmosphere"  # edge destination name for venting
 GAMMA: float = 1.4  # Ratio of specific heats (1.4 for diatomic gases like N2/Air)
 THERMAL_RELAXATION_RATE: float = 0.01  # How fast temp returns to ambient (0.0 to 1.0)
 
@@ -84,115 +88,369 @@ class Valve:
             self.de_energize()
 
 
+class Edge:
+    """
+    A flow path from a source node to a destination node (or the atmosphere if dest is None)
+    Flows while the controlling valve is open using the valve's cv, plus a constant leak cv
+    """
+
+    source: Node
+    dest: Node | None
+    valve: Valve | None
+    leak: float
+
+    def __init__(
+        self, source: Node, dest: Node | None, valve: Valve | None, leak: float = 0.0
+    ):
+        self.source = source
+        self.dest = dest
+        self.valve = valve
+        self.leak = leak
+
+    def get_cv(self) -> float:
+        cv: float = self.leak
+        if self.valve is not None and self.valve.get_state() == State.OPEN:
+            cv += self.valve.cv
+        return cv
+
+
+def _build_topology(config: Config) -> tuple[List[Node], List[Valve], List[Edge]]:
+    """
+    Compiles the 'simulation' section of the config into nodes, valves, and edges
+    Names are resolved once here so nothing needs to be looked up by name per tick
+    """
+    topology: dict = config.simulation
+    if not topology.get("nodes") or not topology.get("edges"):
+        raise Exception(
+            "Config has no 'simulation' section with 'nodes' and 'edges', cannot build System"
+        )
+
+    valves: List[Valve] = []
+    valve_map: dict[str, Valve] = {}
+    for valve_name in config.get_vlvs():
+        normally_closed: bool = config.is_vlv_nc(valve_name)
+        valve = Valve(valve_name, normally_closed, DEFAULT_CV)
+        valves.append(valve)
+        valve_map[valve_name] = valve
+
+    nodes: List[Node] = []
+    node_map: dict[str, Node] = {}
+    for node_name, node_data in topology["nodes"].items():
+        channels: list[str] = []
+        for ch in node_data.get("channels", []):
+            if ch.lower() in config.pts:
+                channels.append(config.get_pt(ch))
+            else:
+                channels.append(config.get_tc(ch))
+        node = Node(
+            name=node_name,
+            channels=channels,
+            volume=float(node_data["volume"]),
+            pressure=float(node_data.get("pressure", 0.0)),
+            temperature=float(node_data.get("temperature", AMBIENT_TEMP)),
+        )
+        nodes.append(node)
+        node_map[node_name.lower()] = node
+
+    edges: List[Edge] = []
+    explicit_cv: dict[str, float] = {}  # a valve shared by several edges has one cv
+    for edge_data in topology["edges"]:
+        source: Node | None = node_map.get(str(edge_data["source"]).lower())
+        if source is None:
+            raise Exception(f"Couldn't find node {edge_data['source']}")
+
+        dest_name: str = str(edge_data.get("dest", ATMOSPHERE))
+        dest: Node | None = None
+        if dest_name.lower() != ATMOSPHERE:
+            dest = node_map.get(dest_name.lower())
+            if dest is None:
+                raise Exception(f"Couldn't find node {dest_name}")
+
+        valve: Valve | None = None
+        if edge_data.get("valve") is not None:
+            valve = valve_map[config.get_vlv(edge_data["valve"])]
+            if edge_data.get("cv") is not None:
+                cv: float = float(edge_data["cv"])
+                if explicit_cv.get(valve.name, cv) != cv:
+                    raise Exception(
+                        f"Conflicting cvs for valve {edge_data['valve']}: "
+                        f"{explicit_cv[valve.name]} and {cv}, edges sharing a valve must agree"
+                    )
+                explicit_cv[valve.name] = cv
+                valve.cv = cv
+
+        edges.append(Edge(source, dest, valve, float(edge_data.get("leak", 0.0))))
+
+    return nodes, valves, edges
+
+
+class _Workspace:
+    """
+    Preallocated buffers and constant edge matrices for the array integrators
+    Node volumes never change, so everything here is built once from the topology
+    Index len(volume) is the atmosphere
+    """
+
+    volume: np.ndarray
+    src: np.ndarray
+    dst: np.ndarray
+    vents: np.ndarray
+    p_pad: np.ndarray  # scratch pressure with a trailing 0.0 for the atmosphere
+    inv_vol: np.ndarray  # 1 / volume with a trailing 0.0 for the atmosphere
+    root_vol: np.ndarray
+    vol_outer: np.ndarray
+    gradient: np.ndarray  # gradient @ p_pad is the pressure drop across every edge
+    incidence: np.ndarray  # incidence @ flow is dP/dt of every node
+    flow: np.ndarray  # scratch, one entry per edge
+    M: np.ndarray  # scratch for _step_exponential
+
+    def __init__(
+        self, volume: np.ndarray, src: np.ndarray, dst: np.ndarray, vents: np.ndarray
+    ):
+        n: int = len(volume)
+        edges: np.ndarray = np.arange(len(src))
+        self.volume = volume
+        self.src = src
+        self.dst = dst
+        self.vents = vents
+        self.p_pad = np.zeros(n + 1, dtype=np.float64)
+        self.inv_vol = np.append(1.0 / volume, 0.0)
+        self.root_vol = np.sqrt(volume)
+        self.vol_outer = np.outer(self.root_vol, self.root_vol)
+
+        self.gradient = np.zeros((len(src), n + 1), dtype=np.float64)
+        np.add.at(self.gradient, (edges, src), 1.0)
+        np.add.at(self.gradient, (edges, dst), -1.0)
+
+        # Venting drops the source by p * k directly without dividing by volume,
+        # the same as System.vent_to_atmosphere
+        incidence: np.ndarray = np.zeros((n + 1, len(src)), dtype=np.float64)
+        np.add.at(incidence, (dst, edges), self.inv_vol[dst])
+        np.add.at(incidence, (src, edges), -np.where(vents, 1.0, self.inv_vol[src]))
+        self.incidence = np.ascontiguousarray(incidence[:n])
+
+        self.flow = np.zeros(len(src), dtype=np.float64)
+        self.M = np.zeros((n, n), dtype=np.float64)
+
+
+def _pressure_rates(pressure: np.ndarray, k: np.ndarray, ws: _Workspace) -> np.ndarray:
+    """
+    dP/dt of every node given each edge's conductance k (per second)
+    """
+    ws.p_pad[: len(pressure)] = pressure
+
+    # No flow if dest is at a higher pressure
+    flow: np.ndarray = np.maximum(ws.gradient @ ws.p_pad, 0.0) * k
+    return ws.incidence @ flow
+
+
+def _step_euler(
+    p_pad: np.ndarray, k: np.ndarray, dt: float, ws: _Workspace
+) -> np.ndarray:
+    """
+    Explicit euler step of the padded pressures, returns the change of every node
+    Only touches preallocated buffers apart from the returned delta
+    """
+    flow: np.ndarray = ws.flow
+    np.matmul(ws.gradient, p_pad, out=flow)
+    np.maximum(flow, 0.0, out=flow)
+    flow *= k
+    flow *= dt
+    return ws.incidence @ flow
+
+
+def _edge_drops(pressure: np.ndarray, ws: _Workspace) -> np.ndarray:
+    """
+    Pressure drop across every edge (source - dest)
+    """
+    ws.p_pad[: len(pressure)] = pressure
+    return ws.gradient @ ws.p_pad
+
+
+def _exponential_modes(
+    active: np.ndarray, k: np.ndarray, ws: _Workspace
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Eigenvalues and eigenvectors of the symmetrized V^-1/2 M V^-1/2 for the active edges
+    """
+    s, d, w, vent = ws.src[active], ws.dst[active], k[active], ws.vents[active]
+    M: np.ndarray = ws.M
+    M.fill(0.0)
+    np.add.at(M, (s[vent], s[vent]), w[vent] * ws.volume[s[vent]])
+    s, d, w = s[~vent], d[~vent], w[~vent]
+    np.add.at(M, (s, s), w)
+    np.add.at(M, (d, d), w)
+    np.add.at(M, (s, d), -w)
+    np.add.at(M, (d, s), -w)
+    return np.linalg.eigh(M / ws.vol_outer)
+
+
+def _step_exponential(
+    pressure: np.ndarray,
+    k: np.ndarray,
+    dt: float,
+    ws: _Workspace,
+    max_substeps: int = 64,
+    bisections: int = 50,
+) -> np.ndarray:
+    """
+    Exact solution of the linear pressure-equalisation ODE V dP/dt = -M P over dt.
+    M only holds the edges that are flowing, so whenever an edge starts or stops flowing
+    part way through the step, the step is split at that moment (found by bisection)
+    and M is rebuilt. M is symmetric, so exp(-V^-1 M t) comes from one eigendecomposition
+    """
+    p: np.ndarray = pressure.copy()
+    remaining: float = dt
+    conducting: np.ndarray = k > 0
+    for substep in range(max_substeps):
+        drops: np.ndarray = _edge_drops(p, ws)
+        active: np.ndarray = conducting & (drops > 0)
+        if not active.any():
+            return p
+        tol: float = 1e-9 * max(1.0, float(np.abs(p).max()))
+
+        # Symmetrize with q = V^(1/2) P so dq/dt = -S q
+        eigvals, eigvecs = _exponential_modes(active, k, ws)
+        rates: np.ndarray = np.maximum(eigvals, 0.0)
+        modes: np.ndarray = eigvecs.T @ (ws.root_vol * p)
+
+        def solve(t: float) -> np.ndarray:
+            return (eigvecs @ (np.exp(-rates * t) * modes)) / ws.root_vol
+
+        def flips(p_t: np.ndarray) -> bool:
+            d: np.ndarray = _edge_drops(p_t, ws)
+            return bool(
+                ((active & (d < -tol)) | (conducting & ~active & (d > tol))).any()
+            )
+
+        end: np.ndarray = solve(remaining)
+        if substep == max_substeps - 1 or not flips(end):
+            return end
+
+        # Advance to just past the first moment an edge starts or stops flowing
+        lo, hi = 0.0, remaining
+        for _ in range(bisections):
+            mid: float = 0.5 * (lo + hi)
+            if flips(solve(mid)):
+                hi = mid
+            else:
+                lo = mid
+        p = solve(hi)
+        remaining -= hi
+    return p
+
+
+# Dormand-Prince RK45 tableau
+_DP_A: list[list[float]] = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+_DP_B: np.ndarray = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+_DP_B_STAR: np.ndarray = np.array(
+    [5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40]
+)
+
+
+def _step_rk45(
+    rates: Callable[[np.ndarray], np.ndarray],
+    pressure: np.ndarray,
+    dt: float,
+    rtol: float = 1e-6,
+    atol: float = 1e-3,  # psi
+) -> np.ndarray:
+    """
+    Adaptive Dormand-Prince (RK45) integration of dP/dt = rates(P) over dt
+    """
+    y: np.ndarray = pressure.copy()
+    t: float = 0.0
+    h: float = dt
+    while t < dt:
+        h = min(h, dt - t)
+        stages: list[np.ndarray] = [rates(y)]
+        for a in _DP_A[1:]:
+            stages.append(rates(y + h * sum(ai * ki for ai, ki in zip(a, stages))))
+        k: np.ndarray = np.array(stages)
+        y_new: np.ndarray = y + h * (_DP_B @ k)
+        err_vec: np.ndarray = h * ((_DP_B - _DP_B_STAR) @ k)
+        scale: np.ndarray = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        err: float = float(np.max(np.abs(err_vec) / scale))
+
+        if err <= 1.0:  # accept step
+            t += h
+            y = y_new
+        h *= 5.0 if err == 0 else min(5.0, max(0.2, 0.9 * err**-0.2))
+    return y
+
+
+def _integrate(
+    integrator: str, pressure: np.ndarray, k: np.ndarray, dt: float, ws: _Workspace
+) -> np.ndarray:
+    """
+    Advances node pressures by dt seconds, all edge flows are evaluated together
+    """
+    if integrator == "exponential":
+        return _step_exponential(pressure, k, dt, ws)
+    if integrator == "rk45":
+        return _step_rk45(lambda p: _pressure_rates(p, k, ws), pressure, dt)
+    ws.p_pad[: len(pressure)] = pressure
+    return pressure + _step_euler(ws.p_pad, k, dt, ws)
+
+
+# Stands in for channels no node lists, read_all_sensors reports 0.0 for them
+_UNKNOWN_NODE: Node = Node("unknown", [], volume=1.0, pressure=0.0, temperature=0.0)
+
+
 class System:
     valves: List[Valve] = []
     nodes: List[Node] = []
+    edges: List[Edge] = []
     config: Config
-
-    def __init__(self, config: Config):
+    integrator: str
+
+    def __init__(self, config: Config, integrator: str = DEFAULT_INTEGRATOR):
+        """
+        integrator is one of INTEGRATORS. "exponential" and "rk45" solve all edges together,
+        giving the same results whatever the timestep. "euler" is the legacy per-tick step,
+        which applies each edge in config order and is only accurate at REFERENCE_RATE
+        """
+        if integrator not in INTEGRATORS:
+            raise Exception(
+                f"Unknown integrator '{integrator}', must be one of {INTEGRATORS}"
+            )
         self.config: Config = config
-        self.valves = []
-        self.nodes = []
-
-        for valve_name in config.get_vlvs():
-            normally_closed: bool = config.is_vlv_nc(valve_name)
-            self.valves.append(
-                Valve(valve_name, normally_closed, 0.02)
-            )  # "default" valve
-
-        # Manually set cv of some valves
-        self.get_valve_obj(config.get_vlv("COPV_Vent")).cv = 0.01
-        self.get_valve_obj(config.get_vlv("Press_Fill_Iso")).cv = 0.02
-        self.get_valve_obj(config.get_vlv("Press_Fill_Vent")).cv = 0.01
-        self.get_valve_obj(config.get_vlv("Ox_Fill_Valve")).cv = 0.0000001
-        self.get_valve_obj(config.get_vlv("Fuel_Dome_Iso")).cv = .05
-
-        self.nodes = [
-            Node(
-                name="COPV",
-                channels=[
-                    config.get_pt("COPV_PT_1"),
-                    config.get_pt("COPV_PT_2"),
-                    config.get_pt("Fuel_TPC_Inlet_PT"),
-                    config.get_tc("COPV_TC_1"),
-                    config.get_tc("COPV_TC_2"),
-                ],
-                volume=COPV_VOLUME,
-                pressure=0,
-            ),
-            Node(
-                name="Bottle 1",
-                channels=[
-                    config.get_pt("Bottle_1_PT"),
-                    config.get_tc("Bottle_1_Skin_TC"),
-                ],
-                volume=STD_BOTTLE_VOLUME,
-                pressure=5600,
-            ),
-            Node(
-                name="Bottle 2",
-                channels=[
-                    config.get_pt("Bottle_2_PT"),
-                    config.get_tc("Bottle_2_Skin_TC"),
-                ],
-                volume=STD_BOTTLE_VOLUME,
-                pressure=5600,
-            ),
-            Node(
-                name="Bottle 3",
-                channels=[
-                    config.get_pt("Bottle_3_PT"),
-                    config.get_tc("Bottle_3_Skin_TC"),
-                ],
-                volume=STD_BOTTLE_VOLUME,
-                pressure=5600,
-            ),
-            Node(
-                name="Bottle 4",
-                channels=[
-                    config.get_pt("Bottle_4_PT"),
-                    config.get_tc("Bottle_4_Skin_TC"),
-                ],
-                volume=STD_BOTTLE_VOLUME,
-                pressure=5600,
-            ),
-            Node(
-                name="press_node",
-                channels=[config.get_pt("Press_Fill_PT")],
-                volume=0.1,  # idk what a good value should be
-                pressure=0,
-            ),
-            Node(
-                name="Ox Dewar",
-                channels=[],
-                volume=999.0,
-                pressure=300,
-            ),
-            Node(
-                name="Ox Tank Level",
-                channels=[config.get_pt("Ox_Level_Sensor")],
-                volume=66.4,
-                pressure=0,
-            ),
-            Node(
-                name="Ox Tank",
-                channels=[
-                    config.get_pt("Ox_Tank_PT_1"),
-                    config.get_pt("Ox_Tank_PT_2"),
-                ],  # add
-                volume=66.4,
-                pressure=0,
-            ),
-            Node(
-                name="Fuel Tank",
-                channels=[
-                    config.get_pt("Fuel_Tank_PT_1"),
-                    config.get_pt("Fuel_Tank_PT_2"),
-                ],  # add
-                volume=59.8,
-                pressure=0,
-            ),
-        ]
+        self.integrator: str = integrator
+        self.nodes, self.valves, self.edges = _build_topology(config)
+
+        # Edge indices for the array integrators, len(nodes) is the atmosphere
+        self._edge_src = np.array(
+            [self.nodes.index(edge.source) for edge in self.edges], dtype=np.intp
+        )
+        self._edge_dst = np.array(
+            [
+                len(self.nodes) if edge.dest is None else self.nodes.index(edge.dest)
+                for edge in self.edges
+            ],
+            dtype=np.intp,
+        )
+        self._edge_vents = np.array([edge.dest is None for edge in self.edges])
+        self._workspace = _Workspace(
+            np.array([node.volume for node in self.nodes], dtype=np.float64),
+            self._edge_src,
+            self._edge_dst,
+            self._edge_vents,
+        )
+
+        # O(1) channel -> node lookup, the first node listing a channel wins
+        self._channel_index: dict[str, Node] = {}
+        for node in self.nodes:
+            for channel in node.channels:
+                self._channel_index.setdefault(channel, node)
+        self._sensor_node_cache: dict[tuple[str, ...], tuple[Node, ...]] = {}
 
     def get_valve_obj(self, name: str) -> Valve:
         for valve in self.valves:
@@ -226,20 +484,37 @@ class System:
                 valve.set_state(cmd)
 
     def get_temperature(self, channel_name: str) -> float:
-        channel_name = channel_name.lower()
-        for node in self.nodes:
-            for channel in node.channels:
-                if channel_name == channel:
-                    return node.temperature
-        return 0.0  # for invalid or non-existant names
+        node: Node | None = self._channel_index.get(channel_name.lower())
+        if node is None:
+            return 0.0  # for invalid or non-existant names
+        return node.temperature
 
     def get_pressure(self, channel_name: str) -> float:
-        channel_name = channel_name.lower()
-        for node in self.nodes:
-            for channel in node.channels:
-                if channel_name == channel:
-                    return node.pressure
-        return 0.0  # for invalid or non-existant names
+        node: Node | None = self._channel_index.get(channel_name.lower())
+        if node is None:
+            return 0.0  # for invalid or non-existant names
+        return node.pressure
+
+    def read_all_sensors(self, channels: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (pressures, temperatures) aligned with channels, 0.0 for unknown channels
+        The nodes for each channel list are resolved once and cached
+        """
+        key: tuple[str, ...] = tuple(channels)
+        nodes: tuple[Node, ...] | None = self._sensor_node_cache.get(key)
+        if nodes is None:
+            nodes = tuple(
+                self._channel_index.get(channel.lower(), _UNKNOWN_NODE)
+                for channel in channels
+            )
+            self._sensor_node_cache[key] = nodes
+        pressures: np.ndarray = np.fromiter(
+            (node.pressure for node in nodes), dtype=np.float64, count=len(nodes)
+        )
+        temperatures: np.ndarray = np.fromiter(
+            (node.temperature for node in nodes), dtype=np.float64, count=len(nodes)
+        )
+        return pressures, temperatures
 
     def _apply_adiabatic_temp_change(
         self, node: Node, old_pressure: float, new_pressure: float
@@ -256,10 +531,14 @@ class System:
         node.temperature = node.temperature * (pressure_ratio**exponent)
 
     def transfer_fluid(self, source_name: str, dest_name: str, cv: float):
-        source = self.get_node_obj(source_name)
-        dest = self.get_node_obj(dest_name)
+        self._transfer(self.get_node_obj(source_name), self.get_node_obj(dest_name), cv)
+
+    def vent_to_atmosphere(self, source_name: str, cv: float):
+        self._vent(self.get_node_obj(source_name), cv)
 
-        if not source or not dest:
+    def _transfer(self, source: Node, dest: Node | None, cv: float):
+        if dest is None:
+            self._vent(source, cv)
             return
 
         p_diff = source.pressure - dest.pressure
@@ -281,11 +560,7 @@ class System:
         # self._apply_adiabatic_temp_change(source, src_p_old, source.pressure)
         # self._apply_adiabatic_temp_change(dest, dest_p_old, dest.pressure)
 
-    def vent_to_atmosphere(self, source_name: str, cv: float):
-        source = self.get_node_obj(source_name)
-        if not source:
-            return
-
+    def _vent(self, source: Node, cv: float):
         p_diff = source.pressure - 0
         if p_diff <= 0:
             return
@@ -297,58 +572,224 @@ class System:
 
         # self._apply_adiabatic_temp_change(source, src_p_old, source.pressure)
 
-    def update(self):
+    def update(self, dt: float | None = None):
+        """
+        Advances the simulation by dt seconds (one tick at REFERENCE_RATE by default)
+        """
         # for node in self.nodes:
         #     node.thermal_relax()
+        if dt is None:
+            dt = 1.0 / REFERENCE_RATE
+
+        if self.integrator == "euler":
+            # Edges are applied in the order they are declared in the config
+            scale: float = dt * REFERENCE_RATE
+            for edge in self.edges:
+                cv: float = edge.get_cv() * scale
+                if cv > 0:
+                    self._transfer(edge.source, edge.dest, cv)
+            return
 
-        press_fill_iso = self.get_valve_obj(self.config.get_vlv("Press_Fill_Iso"))
-        press_fill_vent = self.get_valve_obj(self.config.get_vlv("Press_Fill_Vent"))
-        copv_vent = self.get_valve_obj(self.config.get_vlv("COPV_Vent"))
-        press_iso_1 = self.get_valve_obj(self.config.get_vlv("Press_Iso_1"))
-        press_iso_2 = self.get_valve_obj(self.config.get_vlv("Press_Iso_2"))
-        press_iso_3 = self.get_valve_obj(self.config.get_vlv("Press_Iso_3"))
-        ox_fill_valve = self.get_valve_obj(self.config.get_vlv("Ox_Fill_Valve"))
-        ox_vent = self.get_valve_obj(self.config.get_vlv("Ox_Vent"))
-        ox_pre_press = self.get_valve_obj(self.config.get_vlv("Ox_Pre_Press"))
-        press_iso_4 = self.get_valve_obj(self.config.get_vlv("Press_Iso_4"))
-        fuel_dome_iso = self.get_valve_obj(self.config.get_vlv("Fuel_Dome_Iso"))
-
-        if copv_vent.get_state() == State.OPEN:
-            self.vent_to_atmosphere("COPV", copv_vent.cv)
-
-        if press_iso_1.get_state() == State.OPEN:
-            self.transfer_fluid("Bottle 1", "press_node", press_iso_1.cv)
-
-        if press_iso_2.get_state() == State.OPEN:
-            self.transfer_fluid("Bottle 2", "press_node", press_iso_2.cv)
-
-        if press_iso_3.get_state() == State.OPEN:
-            self.transfer_fluid("Bottle 3", "press_node", press_iso_3.cv)
-
-        if press_iso_4.get_state() == State.OPEN:
-            self.transfer_fluid("Bottle 4", "press_node", press_iso_4.cv)
-
-        if press_fill_iso.get_state() == State.OPEN:
-            self.transfer_fluid("press_node", "COPV", press_fill_iso.cv)
+        k: np.ndarray = (
+            np.array([edge.get_cv() for edge in self.edges]) * REFERENCE_RATE
+        )
+        pressure: np.ndarray = _integrate(
+            self.integrator,
+            np.array([node.pressure for node in self.nodes], dtype=np.float64),
+            k,
+            dt,
+            self._workspace,
+        )
+        for node, p in zip(self.nodes, pressure):
+            node.pressure = float(p)
+
+
+class ArraySystem:
+    """
+    Alternate state engine for System which keeps the plant state in contiguous NumPy arrays.
+    The config topology is compiled once into an edge list, so update() is a single
+    vectorized pass over every edge. With the legacy "euler" integrator, all flows in a tick
+    are computed from the same pressure snapshot, where System applies them one after
+    another in config order, so results differ very slightly from System.
+    """
 
-        if press_fill_vent.get_state() == State.OPEN:
-            self.vent_to_atmosphere("press_node", press_fill_vent.cv)
+    config: Config
+    integrator: str
+    node_names: list[str]
+    valve_names: list[str]
+
+    pressure: np.ndarray  # psi, one entry per node, a view into _pressure_pad
+    temperature: np.ndarray  # degrees celsius, one entry per node, a view into _temperature_pad
+    volume: np.ndarray  # Liters, one entry per node
+    normally_closed: np.ndarray  # bool, one entry per valve
+    valve_open: np.ndarray  # bool, one entry per valve, call invalidate() after editing it directly
+    cv: np.ndarray  # one entry per valve, call invalidate() after editing it directly
+
+    # Node state padded with a trailing 0.0 for the atmosphere and unknown channels
+    _pressure_pad: np.ndarray
+    _temperature_pad: np.ndarray
+
+    _node_index: dict[str, int]
+    _valve_index: dict[str, int]
+    _channel_index: dict[str, int]
+
+    # Edge list, destination index len(nodes) is the atmosphere
+    _edge_src: np.ndarray
+    _edge_dst: np.ndarray
+    _edge_valve: np.ndarray  # -1 for edges without a controlling valve
+    _edge_leak: np.ndarray
+
+    def __init__(self, config: Config, integrator: str = DEFAULT_INTEGRATOR):
+        if integrator not in INTEGRATORS:
+            raise Exception(
+                f"Unknown integrator '{integrator}', must be one of {INTEGRATORS}"
+            )
+        self.config: Config = config
+        self.integrator: str = integrator
+        nodes, valves, edges = _build_topology(config)
+
+        self.node_names = [node.name for node in nodes]
+        self.valve_names = [valve.name for valve in valves]
+        self._node_index = {name.lower(): i for i, name in enumerate(self.node_names)}
+        self._valve_index = {name.lower(): i for i, name in enumerate(self.valve_names)}
+        self._channel_index = {}
+        for i, node in enumerate(nodes):
+            for channel in node.channels:
+                self._channel_index.setdefault(channel, i)
+        self._sensor_index_cache: dict[tuple[str, ...], np.ndarray] = {}
+        self._conductance: np.ndarray | None = None  # per edge, rebuilt on valve changes
+
+        self._pressure_pad = np.array(
+            [node.pressure for node in nodes] + [0.0], dtype=np.float64
+        )
+        self._temperature_pad = np.array(
+            [node.temperature for node in nodes] + [0.0], dtype=np.float64
+        )
+        self.pressure = self._pressure_pad[:-1]
+        self.temperature = self._temperature_pad[:-1]
+        self.volume = np.array([node.volume for node in nodes], dtype=np.float64)
+        self.normally_closed = np.array(
+            [valve.normally_closed for valve in valves], dtype=bool
+        )
+        self.valve_open = np.array(
+            [valve.state == State.OPEN for valve in valves], dtype=bool
+        )
+        self.cv = np.array([valve.cv for valve in valves], dtype=np.float64)
+
+        atmosphere: int = len(nodes)
+        src: list[int] = []
+        dst: list[int] = []
+        vlv: list[int] = []
+        leak: list[float] = []
+        for edge in edges:
+            src.append(self._node_index[edge.source.name.lower()])
+            dst.append(
+                atmosphere
+                if edge.dest is None
+                else self._node_index[edge.dest.name.lower()]
+            )
+            vlv.append(
+                -1 if edge.valve is None else self._valve_index[edge.valve.name]
+            )
+            leak.append(edge.leak)
+        self._edge_src = np.array(src, dtype=np.intp)
+        self._edge_dst = np.array(dst, dtype=np.intp)
+        self._edge_valve = np.array(vlv, dtype=np.intp)
+        self._edge_leak = np.array(leak, dtype=np.float64)
+        self._edge_has_valve = self._edge_valve >= 0
+        self._edge_valve_idx = np.where(self._edge_has_valve, self._edge_valve, 0)
+
+        self._edge_vents = self._edge_dst == atmosphere
+        self._workspace = _Workspace(
+            self.volume, self._edge_src, self._edge_dst, self._edge_vents
+        )
+
+    def _valve(self, valve_name: str) -> int | None:
+        return self._valve_index.get(valve_name.lower())
 
-        if ox_fill_valve.get_state() == State.OPEN:
-            self.transfer_fluid("Ox Dewar", "Ox Tank Level", ox_fill_valve.cv)
+    def get_valve_state(self, valve_name: str) -> State:
+        i: int | None = self._valve(valve_name)
+        if i is None or not self.valve_open[i]:
+            return State.CLOSED  # for invalid or non-existant names
+        return State.OPEN
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached edge conductances, needed only after writing valve_open or cv directly
+        """
+        self._conductance = None
+
+    def energize(self, valve_name: str) -> None:
+        i: int | None = self._valve(valve_name)
+        if i is not None:
+            self.valve_open[i] = self.normally_closed[i]
+            self._conductance = None
+
+    def de_energize(self, valve_name: str) -> None:
+        i: int | None = self._valve(valve_name)
+        if i is not None:
+            self.valve_open[i] = not self.normally_closed[i]
+            self._conductance = None
 
-        if ox_vent.get_state() == State.OPEN:
-            self.vent_to_atmosphere("Ox Tank Level", ox_vent.cv)
+    def toggle_valve(self, valve_name: str):
+        i: int | None = self._valve(valve_name)
+        if i is not None:
+            self.valve_open[i] = not self.valve_open[i]
+            self._conductance = None
 
-        if ox_pre_press.get_state() == State.OPEN:
-            self.transfer_fluid(
-                "Bottle 1", "Ox Tank", ox_pre_press.cv
-            )  # it does not come from bottle 1 but placeholder cuz idk
+    def set_valve(self, valve_name: str, cmd: int):
+        # 1 for open, 0 for closed
+        if cmd == 1:
+            self.energize(valve_name)
+        else:
+            self.de_energize(valve_name)
 
-        if fuel_dome_iso.get_state() == State.OPEN:
-            self.transfer_fluid("Bottle 4", "Fuel Tank", fuel_dome_iso.cv)
-            #Doesn't actually come from bottle 4 but I don't want to sim press fill to sim this
+    def get_temperature(self, channel_name: str) -> float:
+        i: int | None = self._channel_index.get(channel_name.lower())
+        if i is None:
+            return 0.0  # for invalid or non-existant names
+        return float(self.temperature[i])
 
-        self.vent_to_atmosphere("Ox Tank Level", 0.00005)  # Small leak to atmosphere
-        self.vent_to_atmosphere("Ox Tank", 0.00005)  # Small leak to atmosphere
-        self.vent_to_atmosphere("Fuel Tank", 0.00001)  # Small leak to atmosphere
+    def get_pressure(self, channel_name: str) -> float:
+        i: int | None = self._channel_index.get(channel_name.lower())
+        if i is None:
+            return 0.0  # for invalid or non-existant names
+        return float(self.pressure[i])
+
+    def read_all_sensors(self, channels: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (pressures, temperatures) aligned with channels, 0.0 for unknown channels
+        The node index for each channel list is resolved once and cached
+        """
+        key: tuple[str, ...] = tuple(channels)
+        index: np.ndarray | None = self._sensor_index_cache.get(key)
+        if index is None:
+            unknown: int = len(self.pressure)  # points at the 0.0 padding
+            index = np.array(
+                [self._channel_index.get(ch.lower(), unknown) for ch in channels],
+                dtype=np.intp,
+            )
+            self._sensor_index_cache[key] = index
+        return self._pressure_pad[index], self._temperature_pad[index]
+
+    def update(self, dt: float | None = None):
+        """
+        Advances the simulation by dt seconds (one tick at REFERENCE_RATE by default)
+        """
+        if dt is None:
+            dt = 1.0 / REFERENCE_RATE
+
+        # Conductance of every edge: valve cv if open, plus any fixed leak
+        k: np.ndarray | None = self._conductance
+        if k is None:
+            open_cv: np.ndarray = np.where(
+                self._edge_has_valve & self.valve_open[self._edge_valve_idx],
+                self.cv[self._edge_valve_idx],
+                0.0,
+            )
+            k = self._conductance = (open_cv + self._edge_leak) * REFERENCE_RATE
+
+        if self.integrator == "euler":
+            self.pressure += _step_euler(self._pressure_pad, k, dt, self._workspace)
+            return
+        self.pressure[:] = _integrate(self.integrator, self.pressure, k, dt, self._workspace)
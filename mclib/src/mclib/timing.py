@@ -0,0 +1,138 @@
+import math
+import time
+
+HISTOGRAM_MIN: float = 1e-6  # seconds, the lower edge of the first bucket
+HISTOGRAM_DECADES: int = 7  # buckets span 1 us up to 10 s
+HISTOGRAM_BUCKETS_PER_DECADE: int = 20  # ~12% wide buckets
+
+
+class Histogram:
+    """
+    Fixed-size, log-spaced histogram of durations in seconds
+    Recording is O(1) and memory never grows, so it can sit inside a hot loop forever.
+    Percentiles are accurate to one bucket width, max is exact
+    """
+
+    counts: list[int]
+    count: int
+    max: float
+
+    def __init__(self):
+        # Bucket 0 is underflow (< HISTOGRAM_MIN), the last bucket is overflow
+        self.counts = [0] * (HISTOGRAM_DECADES * HISTOGRAM_BUCKETS_PER_DECADE + 2)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        if value < HISTOGRAM_MIN:
+            index: int = 0
+        else:
+            index = 1 + int(
+                math.log10(value / HISTOGRAM_MIN) * HISTOGRAM_BUCKETS_PER_DECADE
+            )
+            index = min(index, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns the upper edge of the bucket holding the p-th percentile (0-100), 0 if empty
+        """
+        if self.count == 0:
+            return 0.0
+        target: float = self.count * p / 100.0
+        seen: int = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target and bucket_count > 0:
+                if index == 0:
+                    return min(HISTOGRAM_MIN, self.max)
+                upper: float = HISTOGRAM_MIN * 10 ** (
+                    index / HISTOGRAM_BUCKETS_PER_DECADE
+                )
+                return min(upper, self.max)
+        return self.max
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.max = 0.0
+
+
+class LoopStats:
+    """
+    Measures the health of a fixed-rate loop. Call wake() as soon as the loop wakes up
+    and done() at the end of the iteration's work. Records:
+    - work time: wake() to done()
+    - lateness: how long after its scheduled tick (first wake-up + n * interval) the loop woke,
+      so drift that builds up over many ticks shows up rather than resetting every tick
+    - overruns: iterations whose work took longer than the interval
+    - missed deadlines: ticks skipped because a wake-up was a whole interval or more late.
+      The schedule moves past them, so lateness stays within one interval
+    """
+
+    interval: float
+    work: Histogram
+    lateness: Histogram
+    iterations: int
+    overruns: int
+    missed: int
+
+    _start: float | None  # First wake-up, tick 0 of the schedule
+    _tick: int  # Index of the next scheduled tick
+    _wake: float
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.work = Histogram()
+        self.lateness = Histogram()
+        self._start = None
+        self._tick = 0
+        self._wake = time.perf_counter()
+        self.reset()
+
+    def wake(self) -> None:
+        now: float = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        else:
+            late: float = now - (self._start + self._tick * self.interval)
+            skipped: int = int(late // self.interval) if late >= self.interval else 0
+            if skipped > 0:
+                self.missed += skipped
+                self._tick += skipped
+                late -= skipped * self.interval
+            self.lateness.record(max(0.0, late))
+        self._tick += 1
+        self._wake = now
+
+    def done(self) -> None:
+        work: float = time.perf_counter() - self._wake
+        self.work.record(work)
+        self.iterations += 1
+        if work > self.interval:
+            self.overruns += 1
+
+    def summary(self) -> dict[str, float | int]:
+        """
+        Returns p50/p99/max of work time and lateness in milliseconds, plus counters
+        """
+        summary: dict[str, float | int] = {
+            "iterations": self.iterations,
+            "overruns": self.overruns,
+            "missed": self.missed,
+        }
+        for name, histogram in (("work", self.work), ("late", self.lateness)):
+            summary[f"{name}_p50_ms"] = histogram.percentile(50) * 1e3
+            summary[f"{name}_p99_ms"] = histogram.percentile(99) * 1e3
+            summary[f"{name}_max_ms"] = histogram.max * 1e3
+        return summary
+
+    def reset(self) -> None:
+        self.work.reset()
+        self.lateness.reset()
+        self.iterations = 0
+        self.overruns = 0
+        self.missed = 0
@@ -1,6 +1,11 @@
+from typing import Any
+import time
 from synnax.control.controller import Controller
 from mclib.config import Config
 
+# How often frame processors are run when the controller can't run them once per frame
+FRAME_POLL_PERIOD: float = 0.01  # seconds
+
 
 def open_vlv(ctrl: Controller, config: Config, vlv_name: str) -> bool:
     """
@@ -52,3 +57,155 @@ def close_vlv(ctrl: Controller, config: Config, vlv_name: str) -> bool:
 
 def STATE(valve: str) -> str:
     return valve.replace("vlv", "state")
+
+
+class ValveHandle:
+    """
+    A valve bound to a controller, with its state channel name and Normally Open (NO) or
+    Normally Closed (NC) polarity worked out once, so open/close/is_open are cheap enough
+    to call every loop iteration
+    """
+
+    ctrl: Controller
+    name: str  # synnax command channel, e.g. gse_vlv_1
+    state_name: str  # synnax state channel, e.g. gse_state_1
+    is_nc: bool
+
+    def __init__(self, ctrl: Controller, config: Config, vlv_name: str):
+        self.ctrl = ctrl
+        self.name = vlv_name
+        self.state_name = vlv_name.replace("vlv", "state")
+        self.is_nc = config.is_vlv_nc(vlv_name)
+
+    # The power to command for the valve to be open (NC: powered, NO: unpowered) or closed
+    def power_for(self, open: bool) -> bool:
+        return self.is_nc if open else not self.is_nc
+
+    def _power(self) -> Any:
+        current_power = self.ctrl.get(self.state_name)
+        if current_power is None:
+            raise Exception(
+                f"Could not get state of valve: {self.name}, is the valve defined?"
+            )
+        return current_power
+
+    def is_open(self) -> bool:
+        return self._power() == self.is_nc
+
+    def open(self) -> bool:
+        """
+        Opens the valve only if not already open, returns True if it was commanded
+        """
+        if self._power() == self.is_nc:
+            return False
+        self.ctrl[self.name] = self.is_nc
+        return True
+
+    def close(self) -> bool:
+        """
+        Closes the valve only if not already closed, returns True if it was commanded
+        """
+        if self._power() != self.is_nc:
+            return False
+        self.ctrl[self.name] = not self.is_nc
+        return True
+
+
+class ValveBank:
+    """
+    A set of ValveHandles on one controller, indexed by synnax valve name
+    set() commands any number of them in a single controller frame
+    """
+
+    ctrl: Controller
+    valves: dict[str, ValveHandle]
+
+    def __init__(self, ctrl: Controller, config: Config, vlv_names: list[str]):
+        self.ctrl = ctrl
+        self.valves = {name: ValveHandle(ctrl, config, name) for name in vlv_names}
+
+    def __getitem__(self, vlv_name: str) -> ValveHandle:
+        return self.valves[vlv_name]
+
+    def set(
+        self, states: dict[str, bool], extra: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """
+        Commands every valve in states (True = open, False = closed) in one frame,
+        regardless of their current state, along with any extra raw channel values
+        Returns the frame that was written
+        """
+        frame: dict[str, Any] = {
+            name: self.valves[name].power_for(open) for name, open in states.items()
+        }
+        if extra is not None:
+            frame.update(extra)
+        self.ctrl.set(frame)
+        return frame
+
+    def unconfirmed(self, states: dict[str, bool]) -> list[str]:
+        """
+        Returns the valves in states whose state channel doesn't (yet) match
+        """
+        return [
+            name
+            for name, open in states.items()
+            if self.ctrl.get(self.valves[name].state_name)
+            != self.valves[name].power_for(open)
+        ]
+
+    def confirm(
+        self, states: dict[str, bool], timeout: float = 1.0, start: float | None = None
+    ) -> float | None:
+        """
+        Waits for every valve's state channel to match states. Returns the seconds from start
+        (a time.perf_counter() value, defaults to now) to the last confirmation, or None if
+        they didn't all confirm within timeout (see unconfirmed())
+        """
+        if start is None:
+            start = time.perf_counter()
+        if len(self.unconfirmed(states)) == 0 or self.ctrl.wait_until(
+            lambda c: len(self.unconfirmed(states)) == 0, timeout=timeout
+        ):
+            return time.perf_counter() - start
+        return None
+
+    def set_and_confirm(
+        self,
+        states: dict[str, bool],
+        extra: dict[str, Any] | None = None,
+        timeout: float = 1.0,
+    ) -> float | None:
+        """
+        set() then confirm(), returns the seconds from the write to the last confirmation
+        """
+        start: float = time.perf_counter()
+        self.set(states, extra)
+        return self.confirm(states, timeout, start)
+
+
+def add_frame_processor(ctrl: Controller, processor: Any) -> bool:
+    """
+    Registers processor (anything with process(ctrl)) to run once per frame the controller
+    receives, on its receiver thread, the same way the controller's own wait_until does.
+    Returns False if the controller has no receiver to register with, in which case the
+    caller should poll processor.process(ctrl) every FRAME_POLL_PERIOD instead
+    """
+    # _receiver is private to synnax's Controller, checked against synnax 0.49.0.
+    # Controller.__getattr__ looks unknown attributes up as channels, so if it's ever
+    # renamed this raises a query error rather than an AttributeError
+    try:
+        receiver = ctrl._receiver
+    except Exception:
+        return False
+    if not (hasattr(receiver, "add_processor") and hasattr(receiver, "remove_processor")):
+        return False
+    receiver.add_processor(processor)
+    return True
+
+
+def remove_frame_processor(ctrl: Controller, processor: Any) -> None:
+    """
+    Unregisters a processor that add_frame_processor registered
+    """
+    ctrl._receiver.remove_processor(processor)
@@ -0,0 +1,96 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy",
+#     "pyyaml",
+#     "termcolor",
+#     "mclib",
+# ]
+#
+# [tool.uv]
+# reinstall-package = ["mclib"]
+# [tool.uv.sources]
+# mclib = { path = "../mclib" }
+# ///
+
+# Benchmarks the simulation state engines against each other without needing Synnax
+
+from termcolor import colored
+from mclib.system import ArraySystem, System
+from mclib.config import Config
+
+import argparse
+import time
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulation state engines in ticks/sec"
+    )
+    parser.add_argument(
+        "-m",
+        "--config",
+        help="The file to use for channel config",
+        default="config.yaml",
+        type=str,
+    )
+    parser.add_argument(
+        "-t",
+        "--ticks",
+        help="Number of update() ticks to run per engine",
+        default=20000,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+# Open a realistic set of valves so every branch of update() has flow
+def open_valves(system: System | ArraySystem, config: Config) -> None:
+    for name in [
+        "Press_Iso_1",
+        "Press_Iso_2",
+        "Press_Fill_Iso",
+        "Ox_Fill_Valve",
+        "Ox_Pre_Press",
+        "Fuel_Dome_Iso",
+    ]:
+        system.set_valve(config.get_vlv(name), 1)
+
+
+# Runs a tick the same way simulation.py does: read every sensor in one call, then update
+def bench(system: System | ArraySystem, config: Config, ticks: int) -> float:
+    sensors: list[str] = config.get_pts() + config.get_tcs()
+    start: float = time.perf_counter()
+    for _ in range(ticks):
+        system.read_all_sensors(sensors)
+        system.update()
+    return ticks / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    config = Config(args.config)
+
+    results: dict[str, float] = {}
+    for name, engine in [("System", System), ("ArraySystem", ArraySystem)]:
+        system = engine(config)
+        open_valves(system, config)
+        results[name] = bench(system, config, args.ticks)
+        print(f"{name:>12}: {results[name]:>12,.0f} ticks/sec")
+
+    speedup: float = results["ArraySystem"] / results["System"]
+    if speedup < 1.0:
+        print(
+            colored(
+                f"WARNING: ArraySystem is slower than System ({speedup:.1f}x)",
+                "red",
+                attrs=["bold"],
+            )
+        )
+    else:
+        print(colored(f"ArraySystem speedup: {speedup:.1f}x", "green", attrs=["bold"]))
+
+
+if __name__ == "__main__":
+    main()
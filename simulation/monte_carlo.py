@@ -0,0 +1,279 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy",
+#     "pyyaml",
+#     "termcolor",
+#     "mclib",
+# ]
+#
+# [tool.uv]
+# reinstall-package = ["mclib"]
+# [tool.uv.sources]
+# mclib = { path = "../mclib" }
+# ///
+
+# Runs thousands of perturbed simulations of the Ox pre-press bang-bang controller in a
+# process pool and reports fill-time and overshoot statistics. Does not need Synnax.
+
+from termcolor import colored
+from mclib.system import DEFAULT_CV, DEFAULT_INTEGRATOR, INTEGRATORS, ArraySystem, System
+from mclib.config import Config
+from mclib.average import average_ch, sensor_vote_values
+from concurrent.futures import ProcessPoolExecutor
+
+import argparse
+import copy
+import math
+import os
+import time
+import numpy as np
+
+REFRESH_RATE: int = 50  # Hz, matches the launch autosequence
+# ox_pre_press's loop periods (phase.sleep) and vote thresholds in launch.py
+MONITOR_PERIOD: float = 0.01  # s, while monitoring
+MONITOR_THRESHOLD: float = 1.0  # psi
+FILL_PERIOD: float = 0.10  # s, while filling
+FILL_THRESHOLD: float = 50  # psi
+STEP: float = MONITOR_PERIOD  # s, simulation timestep, both periods are a whole number of these
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo of Ox pre-press fill time and overshoot over System parameters"
+    )
+    parser.add_argument(
+        "-m",
+        "--config",
+        help="The simulation config to perturb",
+        default="config.yaml",
+        type=str,
+    )
+    parser.add_argument(
+        "-l",
+        "--launch-config",
+        help="The launch autosequence config to read ox_pre_press_target/margin from",
+        default="../autosequences/launch/config.yaml",
+        type=str,
+    )
+    parser.add_argument(
+        "-r", "--runs", help="Number of simulations to run", default=1000, type=int
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        help="Simulated seconds per run",
+        default=60.0,
+        type=float,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes",
+        default=os.cpu_count() or 1,
+        type=int,
+    )
+    parser.add_argument(
+        "-s", "--seed", help="Seed for reproducible runs", default=0, type=int
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        help="Which simulation state engine to use, 'object' or 'array'",
+        default="array",
+        choices=["object", "array"],
+        type=str,
+    )
+    parser.add_argument(
+        "-i",
+        "--integrator",
+        help="How the simulation integrates each timestep: 'exponential', 'rk45', or the legacy per-tick 'euler'",
+        default=DEFAULT_INTEGRATOR,
+        choices=list(INTEGRATORS),
+        type=str,
+    )
+    parser.add_argument(
+        "--cv-spread",
+        help="Relative 1-sigma spread of valve cvs",
+        default=0.10,
+        type=float,
+    )
+    parser.add_argument(
+        "--volume-spread",
+        help="Relative 1-sigma spread of node volumes",
+        default=0.05,
+        type=float,
+    )
+    parser.add_argument(
+        "--pressure-spread",
+        help="Relative 1-sigma spread of starting (bottle) pressures",
+        default=0.05,
+        type=float,
+    )
+    parser.add_argument(
+        "--leak-spread",
+        help="Relative 1-sigma spread of leak rates",
+        default=0.50,
+        type=float,
+    )
+    parser.add_argument(
+        "--noise",
+        help="1-sigma PT noise in psi seen by the controller",
+        default=10.0,
+        type=float,
+    )
+    return parser.parse_args()
+
+
+# Multiplies value by a non-negative random factor with the given relative spread
+def perturb(rng: np.random.Generator, value: float, spread: float) -> float:
+    return value * max(0.0, 1.0 + spread * rng.standard_normal())
+
+
+# Returns a copy of config with the simulation topology perturbed
+def perturbed_config(config: Config, rng: np.random.Generator, args) -> Config:
+    config = copy.deepcopy(config)
+    for node in config.simulation["nodes"].values():
+        node["volume"] = perturb(rng, node["volume"], args.volume_spread)
+        node["pressure"] = perturb(rng, node.get("pressure", 0.0), args.pressure_spread)
+    # One cv per valve, a valve on several edges must keep one cv across them
+    # An edge without a cv uses the valve's cv from its other edges, or the plant default
+    base_cvs: dict[str, float] = {}
+    for edge in config.simulation["edges"]:
+        if edge.get("valve") is not None and edge.get("cv") is not None:
+            base_cvs.setdefault(str(edge["valve"]).lower(), float(edge["cv"]))
+    cvs: dict[str, float] = {}
+    for edge in config.simulation["edges"]:
+        if edge.get("valve") is not None:
+            valve: str = str(edge["valve"]).lower()  # config valve names are case-insensitive
+            if valve not in cvs:
+                cvs[valve] = perturb(rng, base_cvs.get(valve, DEFAULT_CV), args.cv_spread)
+            edge["cv"] = cvs[valve]
+        if edge.get("leak") is not None:
+            edge["leak"] = perturb(rng, edge["leak"], args.leak_spread)
+    return config
+
+
+# Simulates the ox_pre_press phase of launch.py on a simulated clock, with its loop periods,
+# vote thresholds, and the average_ch fed once per loop like the real phase
+# Returns (fill time in seconds or nan, overshoot above the upper bound in psi, valve cycles)
+def run_one(config: Config, rng: np.random.Generator, args) -> tuple[float, float, int]:
+    engine = ArraySystem if args.engine == "array" else System
+    system = engine(config, integrator=args.integrator)
+    pre_press_vlv: str = config.get_vlv("ox_pre_press")
+    ox_tank_pts: list[str] = [
+        config.get_pt("ox_tank_pt_1"),
+        config.get_pt("ox_tank_pt_2"),
+    ]
+    lower_bound: float = args.target - args.margin
+    upper_bound: float = args.target + args.margin
+
+    ox_tank_pressure = average_ch(window=REFRESH_RATE / 2)
+    fill_time: float = math.nan
+    max_pressure: float = 0.0
+    cycles: int = 0
+    steps: int = 0
+    total_steps: int = round(args.duration / STEP)
+
+    def read(threshold: float) -> float:
+        readings: list[float] = [
+            system.get_pressure(pt) + rng.normal(0, args.noise) for pt in ox_tank_pts
+        ]
+        return ox_tank_pressure.add_and_get(sensor_vote_values(readings, threshold=threshold))
+
+    def sleep(period: float) -> None:
+        nonlocal steps, max_pressure
+        for _ in range(round(period / STEP)):
+            system.update(STEP)
+            steps += 1
+            if not math.isnan(fill_time):
+                max_pressure = max(max_pressure, system.get_pressure(ox_tank_pts[0]))
+
+    while steps < total_steps:
+        if read(MONITOR_THRESHOLD) < lower_bound:
+            system.set_valve(pre_press_vlv, 1)
+            cycles += 1
+            while steps < total_steps:
+                if read(FILL_THRESHOLD) >= upper_bound:
+                    break
+                sleep(FILL_PERIOD)
+            else:
+                break  # Ran out of time while filling
+            system.set_valve(pre_press_vlv, 0)
+            if math.isnan(fill_time):
+                fill_time = steps * STEP
+        sleep(MONITOR_PERIOD)
+
+    overshoot: float = max_pressure - upper_bound if not math.isnan(fill_time) else math.nan
+    return fill_time, overshoot, cycles
+
+
+# Worker entry point, runs a chunk of simulations with its own random stream
+def run_chunk(
+    config: Config, seed: np.random.SeedSequence, runs: int, args
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    results = np.empty((runs, 3), dtype=np.float64)
+    for i in range(runs):
+        results[i] = run_one(perturbed_config(config, rng, args), rng, args)
+    return results
+
+
+def print_stats(name: str, unit: str, values: np.ndarray) -> None:
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        print(f"{name:>12}: no samples")
+        return
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    print(
+        f"{name:>12}: mean {values.mean():8.2f}{unit}  p5 {p5:8.2f}{unit}  "
+        f"p50 {p50:8.2f}{unit}  p95 {p95:8.2f}{unit}  max {values.max():8.2f}{unit}"
+    )
+
+
+def main():
+    args = parse_args()
+    config = Config(args.config)
+    launch_config = Config(args.launch_config)
+    args.target = launch_config.get_var("ox_pre_press_target")
+    args.margin = launch_config.get_var("ox_pre_press_margin")
+
+    jobs: int = max(1, min(args.jobs, args.runs))
+    chunks: list[int] = [len(c) for c in np.array_split(np.arange(args.runs), jobs)]
+    seeds = np.random.SeedSequence(args.seed).spawn(jobs)
+
+    start: float = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(run_chunk, config, seeds[i], chunks[i], args)
+            for i in range(jobs)
+        ]
+        results: np.ndarray = np.concatenate([f.result() for f in futures])
+    elapsed: float = time.perf_counter() - start
+
+    fill_times, overshoots, cycles = results[:, 0], results[:, 1], results[:, 2]
+    missed: int = int(np.isnan(fill_times).sum())
+    print(
+        colored(
+            f"Ox pre-press target {args.target} +/- {args.margin} psi, "
+            f"{args.runs} runs of {args.duration}s in {elapsed:.1f}s on {jobs} processes",
+            "green",
+            attrs=["bold"],
+        )
+    )
+    print_stats("Fill time", "s", fill_times)
+    print_stats("Overshoot", "psi", overshoots)
+    print_stats("Cycles", "", cycles)
+    if missed > 0:
+        print(
+            colored(
+                f"{missed} runs ({100 * missed / args.runs:.1f}%) never reached the upper bound",
+                "red",
+                attrs=["bold"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
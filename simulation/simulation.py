@@ -6,6 +6,7 @@
 #     "yaspin",
 #     "termcolor",
 #     "pyyaml",
+#     "numpy",
 #     "mclib",
 # ]
 #
@@ -17,8 +18,11 @@
 
 from termcolor import colored
 from yaspin import yaspin
-from mclib.system import State, System
+from mclib.system import DEFAULT_INTEGRATOR, INTEGRATORS, ArraySystem, System
 from mclib.config import Config
+from mclib.noise import SensorNoise
+from mclib.sampler import PlantSampler
+from mclib.timing import LoopStats
 
 # fun spinner while we load packages
 spinner = yaspin()
@@ -26,7 +30,11 @@ spinner.text = colored("Initializing...", "yellow")
 spinner.start()
 
 import argparse
-import random
+import csv
+import json
+import time
+import yaml
+import numpy as np
 import synnax as sy
 
 do_noise = True
@@ -55,6 +63,12 @@ def parse_args() -> argparse.Namespace:
         default="True",
         type=str,
     )
+    parser.add_argument(
+        "--seed",
+        help="Seed for the simulated sensor noise, for reproducible runs",
+        default=None,
+        type=int,
+    )
     parser.add_argument(
         "-m",
         "--config",
@@ -76,6 +90,62 @@ def parse_args() -> argparse.Namespace:
         default=50,
         type=int,
     )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help="Number of ticks to accumulate into each Synnax write (1 writes every tick)",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "-s",
+        "--stats-file",
+        help="A file to append loop timing stats (work time, lateness, missed deadlines) to as JSON lines",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        help="Which simulation state engine to use, 'object' or 'array'",
+        default="object",
+        choices=["object", "array"],
+        type=str,
+    )
+    parser.add_argument(
+        "-i",
+        "--integrator",
+        help="How the simulation integrates each timestep: 'exponential', 'rk45', or the legacy per-tick 'euler'",
+        default=DEFAULT_INTEGRATOR,
+        choices=list(INTEGRATORS),
+        type=str,
+    )
+    parser.add_argument(
+        "--headless",
+        help="Run without Synnax on a simulated clock as fast as possible",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeline",
+        help="A .yaml file of timed valve commands to replay in headless mode",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        help="Simulated seconds to run for in headless mode",
+        default=60.0,
+        type=float,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="The .csv file to write sensor and state series to in headless mode",
+        default="simulation_output.csv",
+        type=str,
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -98,6 +168,8 @@ def parse_args() -> argparse.Namespace:
         do_noise = False
     else:
         error_and_exit("Argument --noise must be followed by either 'true' or 'false'")
+    if args.batch < 1:
+        error_and_exit("Argument --batch must be at least 1")
     return args
 
 
@@ -159,66 +231,205 @@ def get_channels(client: sy.Synnax, config: Config):
         )
 
 
+# Accumulates ticks of timestamps, states, and sensor values into preallocated arrays
+# so they can be written to Synnax as one multi-sample frame
+class FrameBatch:
+    states: list[str]
+    sensors: list[str]
+    size: int
+    count: int
+    times: np.ndarray
+    state_values: np.ndarray
+    sensor_values: np.ndarray
+
+    def __init__(self, states: list[str], sensors: list[str], size: int):
+        self.states = states
+        self.sensors = sensors
+        self.size = size
+        self.count = 0
+        self.times = np.empty(size, dtype=np.int64)
+        self.state_values = np.empty((len(states), size), dtype=np.int8)
+        self.sensor_values = np.empty((len(sensors), size), dtype=np.float32)
+
+    # Adds one tick, returns True once the batch is full
+    def add(self, time: sy.TimeStamp, states: np.ndarray, sensors: np.ndarray) -> bool:
+        self.times[self.count] = time
+        self.state_values[:, self.count] = states
+        self.sensor_values[:, self.count] = sensors
+        self.count += 1
+        return self.count >= self.size
+
+    # Returns the accumulated ticks as a frame and empties the batch
+    def flush(self) -> dict:
+        n: int = self.count
+        frame: dict = {
+            "time": sy.Series(self.times[:n].copy(), data_type=sy.DataType.TIMESTAMP)
+        }
+        for i, state_ch in enumerate(self.states):
+            frame[state_ch] = self.state_values[i, :n].copy()
+        for i, sensor_ch in enumerate(self.sensors):
+            frame[sensor_ch] = self.sensor_values[i, :n].copy()
+        self.count = 0
+        return frame
+
+
 # A fake driver that writes data to all channels according to the simulation
 @yaspin(text=colored("Running Simulation...", "green"))
 def driver(
-    config: Config, streamer: sy.Streamer, writer: sy.Writer, system: System, args
+    config: Config,
+    streamer: sy.Streamer,
+    writer: sy.Writer,
+    system: System | ArraySystem,
+    sampler: PlantSampler,
+    args,
 ):
-    global do_noise
     driver_frequency = args.frequency  # Hz
+    dt = 1.0 / driver_frequency  # seconds per tick
     loop = sy.Loop(interval=(sy.Rate.HZ * driver_frequency))
 
-    while loop.wait():
-        write_data: dict = {}
-        write_data["time"] = sy.TimeStamp.now()
-
-        # Check for incoming valve commands
-        fr = streamer.read(timeout=0)
-        if fr is not None:
-            for channel in fr.channels:
-                cmd = fr[channel][0]
-                valve = system.get_valve_obj(channel)  # type: ignore
-                if cmd == True:
-                    valve.energize()
-                else:
-                    valve.de_energize()
-
-        for state_ch in config.get_states():
-            valve = system.get_valve_obj(state_ch.replace("state", "vlv"))
-            if valve.normally_closed:  # Account for normally open valves
-                if valve.state == State.OPEN:
-                    write_data[state_ch] = 1
-                else:
-                    write_data[state_ch] = 0
+    # With --batch > 1, ticks are written as one frame every args.batch ticks
+    batch = FrameBatch(sampler.states, sampler.sensors, args.batch)
+    values_per_tick: int = 1 + len(batch.states) + len(batch.sensors)
+
+    # Loop jitter and overrun tracking, reported (and optionally saved) periodically
+    stats = LoopStats(dt)
+    report_interval: float = 5.0  # seconds between stats reports
+    report_start: float = time.perf_counter()
+    report_writes: int = 0
+
+    try:
+        while loop.wait():
+            stats.wake()
+
+            # Check for incoming valve commands
+            fr = streamer.read(timeout=0)
+            if fr is not None:
+                for channel in fr.channels:
+                    cmd = fr[channel][0]
+                    system.set_valve(channel, 1 if cmd == True else 0)  # type: ignore
+
+            if args.batch == 1:
+                write_data: dict = {}
+                write_data["time"] = sy.TimeStamp.now()
+                write_data.update(sampler.sample(dt))
+                writer.write(write_data)  # type: ignore
+                report_writes += 1
             else:
-                if valve.state == State.OPEN:
-                    write_data[state_ch] = 0
-                else:
-                    write_data[state_ch] = 1
-
-        for pt_ch in config.get_pts():
-            noise = (
-                (random.gauss(0, 10)) if (do_noise) else (0)
-            )  # instrument noise is approximately gaussian
-            # TODO: add different noise for different instruments with some sort of lookup table
-            pressure = system.get_pressure(pt_ch) + noise
-            write_data[pt_ch] = pressure
-        for tc_ch in config.get_tcs():
-            noise = (
-                (random.gauss(0, 2)) if (do_noise) else (0)
-            )  # instrument noise is approximately gaussian
-            temperature = system.get_temperature(tc_ch) + noise
-            write_data[tc_ch] = temperature
-
-        writer.write(write_data)  # type: ignore
-        system.update()
+                states, sensors = sampler.sample_arrays(dt)
+                if batch.add(sy.TimeStamp.now(), states, sensors):
+                    writer.write(batch.flush())  # type: ignore
+                    report_writes += 1
+            system.update(dt)
+            stats.done()
+
+            elapsed: float = time.perf_counter() - report_start
+            if elapsed >= report_interval:
+                report_stats(stats, report_writes, elapsed, values_per_tick, args)
+                report_start = time.perf_counter()
+                report_writes = 0
+                stats.reset()
+    finally:
+        # Write out a partly filled batch, so the last ticks aren't dropped on exit
+        if batch.count > 0:
+            writer.write(batch.flush())  # type: ignore
+
+
+# Prints throughput and loop timing stats, and appends them to args.stats_file if given
+def report_stats(
+    stats: LoopStats, writes: int, elapsed: float, values_per_tick: int, args
+) -> None:
+    summary: dict = stats.summary()
+    color: str = "cyan"
+    if summary["missed"] > 0 or summary["overruns"] > 0:
+        color = "red"  # We're falling behind --frequency
+    spinner.write(
+        colored(
+            f"{summary['iterations'] / elapsed:.1f} ticks/s of {args.frequency} Hz, "
+            f"{writes / elapsed:.1f} writes/s, "
+            f"{summary['iterations'] * values_per_tick / elapsed:,.0f} samples/s | "
+            f"work p50 {summary['work_p50_ms']:.2f} p99 {summary['work_p99_ms']:.2f} "
+            f"max {summary['work_max_ms']:.2f} ms | "
+            f"late p50 {summary['late_p50_ms']:.2f} p99 {summary['late_p99_ms']:.2f} "
+            f"max {summary['late_max_ms']:.2f} ms | "
+            f"{summary['overruns']} overruns, {summary['missed']} missed",
+            color,
+        )
+    )
+    if args.stats_file != "":
+        summary["time"] = sy.TimeStamp.now()
+        summary["frequency"] = args.frequency
+        with open(args.stats_file, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+# Loads a list of timed valve commands, sorted by time. Each entry looks like:
+#   - { time: 1.5, valve: Ox_Pre_Press, cmd: 1 }  # seconds, config valve name, 1 = energize
+def load_timeline(filepath: str, config: Config) -> list[tuple[float, str, int]]:
+    with open(filepath, "r") as f:
+        entries: list[dict] = yaml.safe_load(f) or []
+
+    timeline: list[tuple[float, str, int]] = []
+    for entry in entries:
+        timeline.append(
+            (
+                float(entry["time"]),
+                config.get_vlv(entry["valve"]),
+                1 if entry["cmd"] in (1, True) else 0,
+            )
+        )
+    timeline.sort(key=lambda cmd: cmd[0])
+    return timeline
+
+
+# Steps the simulation on a simulated clock as fast as possible, replaying a timeline
+# of valve commands and writing every tick to a .csv file. Does not need Synnax.
+@yaspin(text=colored("Running Headless Simulation...", "green"))
+def headless_driver(
+    config: Config, system: System | ArraySystem, sampler: PlantSampler, args
+):
+    timeline = load_timeline(args.timeline, config) if args.timeline != "" else []
+    dt: float = 1.0 / args.frequency  # simulated seconds per tick
+    ticks: int = int(round(args.duration * args.frequency))
+    channels: list[str] = config.get_states() + config.get_sensors()
+    next_cmd: int = 0
+
+    start: float = time.perf_counter()
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time"] + channels)
+        for tick in range(ticks):
+            sim_time: float = tick * dt
+            while next_cmd < len(timeline) and timeline[next_cmd][0] <= sim_time:
+                _, valve_name, cmd = timeline[next_cmd]
+                system.set_valve(valve_name, cmd)
+                next_cmd += 1
+
+            data: dict = sampler.sample(dt)
+            writer.writerow([sim_time] + [data[ch] for ch in channels])
+            system.update(dt)
+    elapsed: float = time.perf_counter() - start
+
+    spinner.write(
+        colored(
+            f"Simulated {args.duration}s in {elapsed:.2f}s "
+            f"({args.duration / elapsed:.0f}x real time), wrote {args.output}",
+            "green",
+        )
+    )
 
 
 def main():
     args = parse_args()
-    client = synnax_login(args.cluster)
     config = Config(args.config)
-    system = System(config)
+    engine = ArraySystem if args.engine == "array" else System
+    system = engine(config, integrator=args.integrator)
+    noise = SensorNoise(config, config.get_pts() + config.get_tcs(), seed=args.seed)
+    sampler = PlantSampler(config, system, noise if do_noise else None)
+    if args.headless:
+        headless_driver(config, system, sampler, args)
+        return
+
+    client = synnax_login(args.cluster)
     get_channels(client, config)
     # Open streamer for valve commands
 
@@ -228,7 +439,7 @@ def main():
     with client.open_streamer(channels=write_chs) as streamer:
         # Open writer for everything else
         with client.open_writer(start=sy.TimeStamp.now(), channels=read_chs) as writer:
-            driver(config, streamer, writer, system, args)  # Run the fake driver
+            driver(config, streamer, writer, system, sampler, args)  # Run the fake driver
 
 
 if __name__ == "__main__":
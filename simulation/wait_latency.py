@@ -0,0 +1,177 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy",
+#     "pyyaml",
+#     "termcolor",
+#     "mclib",
+# ]
+#
+# [tool.uv]
+# reinstall-package = ["mclib"]
+# [tool.uv.sources]
+# mclib = { path = "../mclib" }
+# ///
+
+# Benchmarks wait_until detection latency: the time from writing the frame that crosses a
+# threshold to wait_until returning. Runs on mclib.offline, so it does not need Synnax.
+
+from termcolor import colored
+from mclib.config import Config
+from mclib.phase import Phase
+from mclib.offline import OfflineController, OfflineSynnax
+
+from typing import Callable
+
+import argparse
+import threading
+import time
+import numpy as np
+import synnax as sy
+
+CHANNEL: str = "bench_pt"
+THRESHOLD: float = 500.0  # psi
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark wait_until threshold detection latency"
+    )
+    parser.add_argument(
+        "-m",
+        "--config",
+        help="The file to use for channel config",
+        default="config.yaml",
+        type=str,
+    )
+    parser.add_argument(
+        "-f",
+        "--frequency",
+        help="Rate telemetry frames are written at",
+        default=200,
+        type=int,
+    )
+    parser.add_argument(
+        "-t",
+        "--trials",
+        help="Number of threshold crossings to time per method",
+        default=200,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+# Writes a ramp that crosses THRESHOLD once per trial, recording when each crossing was written
+class Telemetry:
+    crossings: list[float]
+    armed: threading.Event  # set by the waiter once it is waiting for the next crossing
+
+    _client: OfflineSynnax
+    _period: float
+    _rng: np.random.Generator
+
+    def __init__(self, client: OfflineSynnax, frequency: int):
+        self.crossings = []
+        self.armed = threading.Event()
+        self._client = client
+        self._period = 1.0 / frequency
+        self._rng = np.random.default_rng(0)
+
+    def run(self, trials: int) -> None:
+        with self._client.open_writer(
+            start=sy.TimeStamp.now(), channels=["time", CHANNEL]
+        ) as writer:
+            for _ in range(trials):
+                self.armed.wait()
+                self.armed.clear()
+                # A few frames below the threshold, then one above it
+                for _ in range(int(self._rng.integers(1, 5))):
+                    writer.write({"time": sy.TimeStamp.now(), CHANNEL: THRESHOLD - 10})
+                    time.sleep(self._period)
+                self.crossings.append(time.perf_counter())
+                writer.write({"time": sy.TimeStamp.now(), CHANNEL: THRESHOLD + 10})
+                time.sleep(self._period)
+                writer.write({"time": sy.TimeStamp.now(), CHANNEL: THRESHOLD - 10})
+
+
+# Times `trials` threshold crossings with the given wait function
+def bench(
+    client: OfflineSynnax,
+    ctrl: OfflineController,
+    wait: Callable,
+    trials: int,
+    frequency: int,
+) -> np.ndarray:
+    telemetry = Telemetry(client, frequency)
+    writer_thread = threading.Thread(target=telemetry.run, args=(trials,))
+    writer_thread.start()
+
+    detections: list[float] = []
+    for _ in range(trials):
+        # Make sure we start below the threshold before arming
+        while ctrl.get(CHANNEL, 0.0) >= THRESHOLD:
+            time.sleep(0.1 / frequency)
+        telemetry.armed.set()
+        wait(lambda c: c.get(CHANNEL, 0.0) >= THRESHOLD)
+        detections.append(time.perf_counter())
+    writer_thread.join()
+    return np.array(detections) - np.array(telemetry.crossings)
+
+
+def print_stats(name: str, latencies: np.ndarray) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(
+        f"{name:>20}: p50 {p50:8.1f} us  p99 {p99:8.1f} us  max {latencies.max() * 1e6:8.1f} us"
+    )
+
+
+def main():
+    args = parse_args()
+    config = Config(args.config)
+    client = OfflineSynnax()
+    time_channel = client.channels.create(
+        name="time", data_type=sy.DataType.TIMESTAMP, is_index=True
+    )
+    client.channels.create(
+        name=CHANNEL, data_type=sy.DataType.FLOAT32, index=time_channel.key
+    )
+    ctrl = client.control.acquire(name="Wait Latency", read=[CHANNEL])
+
+    print(
+        colored(
+            f"{args.trials} threshold crossings at {args.frequency} Hz",
+            "green",
+            attrs=["bold"],
+        )
+    )
+
+    # Phase.wait_until, run from inside a phase like an autosequence would
+    results: dict[str, np.ndarray] = {}
+
+    def phase_main(phase: Phase) -> None:
+        results["Phase.wait_until"] = bench(
+            client, ctrl, phase.wait_until, args.trials, args.frequency
+        )
+
+    phase = Phase(
+        name="Wait Latency",
+        ctrl=ctrl,  # type: ignore
+        config=config,
+        main_func=phase_main,
+        auto=None,  # type: ignore
+    )
+    phase.start()
+    phase.join()
+    print_stats("Phase.wait_until", results["Phase.wait_until"])
+
+    # The controller's own wait_until for reference (cannot be interrupted by phase signals)
+    print_stats(
+        "Controller.wait_until",
+        bench(client, ctrl, ctrl.wait_until, args.trials, args.frequency),
+    )
+    ctrl.release()
+
+
+if __name__ == "__main__":
+    main()
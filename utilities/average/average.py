@@ -2,14 +2,27 @@
 # /// script
 # requires-python = ">=3.13"
 # dependencies = [
-#     "synnax==0.46.0",
+#     "synnax==0.49.0",
 #     "yaspin",
 #     "termcolor",
+#     "numpy",
+#     "mclib",
 # ]
+# [tool.uv]
+# reinstall-package = ["mclib"]
+# [tool.uv.sources]
+# mclib = { path = "../../mclib" }
 # ///
 
 SENSOR_TIME_CHANNEL = "gse_sensor_time"
 AVG_TIME_CHANNEL = "avg_time"
+# Filter type -> suffix of the channels it writes
+FILTER_SUFFIXES = {
+    "ewma": "_avg",
+    "boxcar": "_boxcar",
+    "median": "_median",
+    "biquad": "_lowpass",
+}
 
 from termcolor import colored
 from yaspin import yaspin
@@ -20,30 +33,14 @@ spinner.text = colored("Initializing...", "yellow")
 spinner.start()
 
 import argparse
+import datetime
+import fnmatch
+import re
+import numpy as np
+import yaml
 import synnax as sy
-
-class average_ch:
-    avg: float
-    initialized: bool
-    alpha: float
-
-    def __init__(self, window: int):
-        # Alpha approximates a window of N items: alpha = 2 / (N + 1)
-        self.alpha = 2.0 / (window + 1)
-        self.avg = 0.0
-        self.initialized = False
-
-    def add(self, value: float) -> None:
-        if not self.initialized:
-            self.avg = value
-            self.initialized = True
-        else:
-            # Standard EWMA formula
-            self.avg = (value * self.alpha) + (self.avg * (1 - self.alpha))
-
-    def get(self) -> float:
-        return self.avg
-
+from mclib.config import Config
+from mclib.average import FilterBank, EWMABank, BoxcarBank, MedianBank, BiquadBank
 
 # helper function to raise pretty errors
 def error_and_exit(message: str, error_code: int = 1, exception=None) -> None:
@@ -65,8 +62,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "-m",
         "--config",
-        help="The file to use for channel config",
-        default="config.yaml",
+        help="The config file to take channels from with `-g` (e.g. ../../autosequences/launch/config.yaml)",
+        default="",
         type=str,
     )
     parser.add_argument(
@@ -101,9 +98,76 @@ def parse_args() -> argparse.Namespace:
         help="Shold the program average all PT channels?",
         action="store_true",
     )  # Positional argument
+    parser.add_argument(
+        "-p",
+        "--pattern",
+        help="Average channels matching this glob (e.g. 'gse_pt_*'), can be given multiple times",
+        action="append",
+        default=[],
+        type=str,
+    )
+    parser.add_argument(
+        "-e",
+        "--regex",
+        help="Average channels matching this regex (e.g. 'gse_pt_(1|2|3)'), can be given multiple times",
+        action="append",
+        default=[],
+        type=str,
+    )
+    parser.add_argument(
+        "-g",
+        "--from-config",
+        help="Average the PT and TC channels in the config file",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-f",
+        "--filter",
+        help=f"Filter to run, one of {', '.join(FILTER_SUFFIXES)}, optionally only on channels matching a glob (e.g. 'median:gse_pt_1*'). Can be given multiple times, defaults to ewma",
+        action="append",
+        default=[],
+        type=str,
+    )
+    parser.add_argument(
+        "--cutoff",
+        help="Cutoff frequency of the biquad low-pass filter in Hz",
+        default=5.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--rate",
+        help="Sample rate of the channels in Hz, used by the biquad low-pass filter",
+        default=50.0,
+        type=float,
+    )
+    parser.add_argument(
+        "-r",
+        "--range",
+        help="Backfill averages for a named range instead of averaging live",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--start",
+        help="Backfill averages from this time instead of averaging live (ISO 8601, include the UTC offset, e.g. 2025-04-12T14:03:00-04:00)",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--end",
+        help="End of the time span to backfill, defaults to now",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--chunk",
+        help="Number of samples per channel to read at a time when backfilling",
+        default=100_000,
+        type=int,
+    )
     args = parser.parse_args()
-    # check that if there was an alternate config file given, that it is at least a .yaml file
-    if args.config != "config.yaml":
+    # check that if there was a config file given, that it is at least a .yaml file
+    if args.config != "":
         if args.config.endswith(".yaml"):
             if args.verbose:
                 print(colored(f"Using config from file: {args.config}", "yellow"))
@@ -111,10 +175,23 @@ def parse_args() -> argparse.Namespace:
             error_and_exit(
                 f"Invalid specified config file: {args.config}, must be .yaml file"
             )
-    if not args.all: # TODO: remove this when channel selections are supported
+    if args.from_config and (args.config == ""):
         error_and_exit(
-            f"Averaging for specific channels not yet supported, please use the flag `-a` to average all channels\n Example: ./average -a"
+            "Averaging channels from a config needs a config file, use `-m <config.yaml>`\n Example: ./average -g -m ../../autosequences/launch/config.yaml"
         )
+    if not (args.all or args.pattern or args.regex or args.from_config):
+        error_and_exit(
+            f"Please select channels to average with `-a`, `-p <glob>`, `-e <regex>`, or `-g`\n Example: ./average -a"
+        )
+    if len(args.filter) == 0:
+        args.filter = ["ewma"]
+    for spec in args.filter:
+        if spec.split(":", 1)[0] not in FILTER_SUFFIXES:
+            error_and_exit(f"Unknown filter '{spec}', must be one of {', '.join(FILTER_SUFFIXES)}")
+    if (args.range != "") and (args.start != ""):
+        error_and_exit("Specify either a range or a start time to backfill, not both")
+    if (args.end != "") and (args.start == ""):
+        error_and_exit("An end time needs a start time, use --start")
     if args.simulation:
         SENSOR_TIME_CHANNEL = "time"
 
@@ -137,9 +214,115 @@ def synnax_login(cluster: str) -> sy.Synnax:
     return client  # type: ignore
 
 
+# Converts a glob (e.g. gse_pt_*, PT_[12]*) to the equivalent anchored regex for Synnax,
+# following fnmatch's rules for *, ?, [seq], and [!seq]
+def glob_to_regex(glob: str) -> str:
+    parts = []
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        i += 1
+        if c == "*":
+            parts.append(".*")
+        elif c == "?":
+            parts.append(".")
+        elif c == "[":
+            j = i
+            if (j < len(glob)) and (glob[j] == "!"):
+                j += 1
+            if (j < len(glob)) and (glob[j] == "]"):
+                j += 1  # A leading ] is part of the set
+            while (j < len(glob)) and (glob[j] != "]"):
+                j += 1
+            if j >= len(glob):
+                parts.append(re.escape(c))  # No closing ], so it's a literal [
+                continue
+            chars = glob[i:j].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            elif chars.startswith("^"):
+                chars = "\\" + chars
+            parts.append(f"[{chars}]")
+            i = j + 1
+        else:
+            parts.append(re.escape(c))
+    return "^" + "".join(parts) + "$"
+
+
+# Loads the channel config, exiting if the file is missing or empty
+def load_config(filepath: str) -> Config:
+    try:
+        with open(filepath, "r") as f:
+            data = yaml.safe_load(f)
+    except OSError as e:
+        error_and_exit(f"Could not open config file: {filepath}", exception=e)
+    except yaml.YAMLError as e:
+        error_and_exit(f"Could not parse config file: {filepath}", exception=e)
+    if not isinstance(data, dict):  # safe_load gives None for an empty file
+        error_and_exit(f"Config file {filepath} is empty")
+    return Config(filepath)
+
+
+# Returns the names of the channels selected by the arguments
+# Only channels matching the selection are queried, rather than the whole channel catalogue
+def select_channels(client: sy.Synnax, args) -> list[str]:
+    names = []
+    if args.from_config:
+        # Exact names, so only those channels are retrieved
+        config_chs = load_config(args.config).get_sensors()
+        if len(config_chs) == 0:
+            error_and_exit(f"Config file {args.config} has no PTs or TCs in its channel mappings")
+        names += [ch.name for ch in client.channels.retrieve(config_chs)]
+
+    # Synnax matches retrieved names as regexes, so only ask for the ones we want
+    # Globs are then matched with fnmatch, the same as the globs in --filter
+    selections = [(glob, lambda name, glob=glob: fnmatch.fnmatch(name, glob)) for glob in args.pattern]
+    selections += [(regex, re.compile(regex).fullmatch) for regex in args.regex]
+    queries = [glob_to_regex(glob) for glob in args.pattern] + args.regex
+    if args.all:
+        selections.append(("-a", re.compile(".*pt.*").fullmatch))
+        queries.append(".*pt.*")
+    if len(queries) > 0:
+        candidates = [ch for ch in client.channels.retrieve(queries) if ch.data_type == sy.DataType.FLOAT32]
+        for selection, matches in selections:
+            matched = [ch.name for ch in candidates if matches(ch.name)]
+            if len(matched) == 0:
+                spinner.write(colored(f"No float32 channels matched '{selection}'", "red"))
+            names += matched
+
+    # Never filter our own output channels, and keep the order stable
+    derived = tuple(FILTER_SUFFIXES.values())
+    return sorted(set(name for name in names if not name.endswith(derived)))
+
+
+# Builds the filter banks the arguments ask for, returns (bank, output suffix) pairs
+def make_filters(channels: list[str], args) -> list[tuple[FilterBank, str]]:
+    filters = []
+    for spec in args.filter:
+        kind, _, glob = spec.partition(":")
+        chs = [ch for ch in channels if (glob == "") or fnmatch.fnmatch(ch, glob)]
+        if len(chs) == 0:
+            continue
+        match kind:
+            case "ewma":
+                bank = EWMABank(chs, args.window)
+            case "boxcar":
+                bank = BoxcarBank(chs, args.window)
+            case "median":
+                bank = MedianBank(chs, args.window)
+            case "biquad":
+                bank = BiquadBank(chs, args.cutoff, args.rate)
+            case _:
+                error_and_exit(
+                    f"Unknown filter type '{kind}', must be one of {list(FILTER_SUFFIXES)}"
+                )
+        filters.append((bank, FILTER_SUFFIXES[kind]))
+    return filters
+
+
 # Returns write_channels and read_channels
 @yaspin(text=colored("Setting up channels...", "yellow"))
-def setup_channels(client: sy.Synnax) -> tuple[list[str], list[str]]:
+def setup_channels(client: sy.Synnax, args) -> tuple[list[str], list[str]]:
     avg_time = client.channels.create(
         name=AVG_TIME_CHANNEL,
         data_type=sy.DataType.TIMESTAMP,
@@ -147,24 +330,24 @@ def setup_channels(client: sy.Synnax) -> tuple[list[str], list[str]]:
         retrieve_if_name_exists=True,
     )
 
-    read_channels = []
+    read_channels = select_channels(client, args)
+    if len(read_channels) == 0:
+        error_and_exit("No channels matched the selection, nothing to average")
     write_channels = []
 
-    for channel in client.channels.retrieve(["*"]): # get all channels with some cursed API usage
-        # TODO: Add option to change channel types to be averaged (maybe per board or sensor type)
-        if (channel.data_type == sy.DataType.FLOAT32) and ("pt" in channel.name) and ("avg" not in channel.name):
-            read_channels.append(channel.name)
-    
-    for channel in read_channels:
-        avg_name = channel + "_avg"
-        client.channels.create(
-            name=avg_name,
-            index=avg_time.key,
-            data_type=sy.DataType.FLOAT32,
-            retrieve_if_name_exists=True,
-        )
-        write_channels.append(avg_name)
-    
+    for bank, suffix in make_filters(read_channels, args):
+        for channel in bank.channels:
+            avg_name = channel + suffix
+            client.channels.create(
+                name=avg_name,
+                index=avg_time.key,
+                data_type=sy.DataType.FLOAT32,
+                retrieve_if_name_exists=True,
+            )
+            write_channels.append(avg_name)
+    if args.verbose:
+        print(colored(f"Filtering {len(read_channels)} channels into {len(write_channels)} channels", "yellow"))
+
     try: # Check if the sensor time channel specified exists
         client.channels.retrieve(SENSOR_TIME_CHANNEL)
         read_channels.append(SENSOR_TIME_CHANNEL) # add time channel to read from
@@ -175,40 +358,100 @@ def setup_channels(client: sy.Synnax) -> tuple[list[str], list[str]]:
 
     return write_channels, read_channels
 
+# Runs every sample of a frame through the filters, returns the frame to write
+# The filtered series have the same samples and timestamps as the input, whatever the batch size
+def average_frame(frame, filters: list[tuple[FilterBank, str]]) -> dict | None:
+    if SENSOR_TIME_CHANNEL not in frame:
+        return None
+    times = np.asarray(frame[SENSOR_TIME_CHANNEL])
+    if len(times) == 0:
+        return None
+
+    write_data = {}
+    for bank, suffix in filters:
+        filtered = bank.add_frame(frame)
+        for channel_name in bank.channels:
+            series = filtered.get(channel_name)
+            if (series is None) or (len(series) != len(times)):
+                # Not in this frame (or on another index), hold the last output
+                series = np.full(len(times), bank.get(channel_name))
+            write_data[channel_name + suffix] = series.astype(np.float32)
+
+    write_data[AVG_TIME_CHANNEL] = times # Write to the same times the samples were from
+    return write_data
+
+
 # A driver to write average values to the server
 @yaspin(text=colored("Running Averaging...", "green"))
 def driver(streamer: sy.Streamer, writer: sy.Writer, read_chs: list[str], args):
-    window_size = args.window # TODO: add to config
-
-    # Create an average channel for each channel we're reading from
-    avg_channels = {}
-    for channel_name in read_chs:
-        if "pt" not in channel_name:
-            continue # Skip non-PT channels like time channels
-        avg_channels[channel_name] = average_ch(window_size)
-    
-    for frame in streamer:
-        write_data = {}
-        
-        for channel_name in read_chs:
-            if "pt" not in channel_name:
-                continue # Skip non-PT channels like time channels
-            raw_value = frame[channel_name]
-            avg_channels[channel_name].add(raw_value)
-            write_data[channel_name + "_avg"] = avg_channels[channel_name].get()
+    # Vectorized filters over every channel we're reading from
+    filters = make_filters([ch for ch in read_chs if ch != SENSOR_TIME_CHANNEL], args)
 
-        write_data[AVG_TIME_CHANNEL] = frame[SENSOR_TIME_CHANNEL] # Write to the same time the frame was from
+    for frame in streamer:
+        write_data = average_frame(frame, filters)
+        if write_data is None:
+            continue
 
         # Warning if we're writing data that is more than 1 second in the past
-        if (sy.TimeStamp.since(frame[SENSOR_TIME_CHANNEL][0]) > sy.TimeSpan.from_seconds(1)):
+        if (sy.TimeStamp.since(int(write_data[AVG_TIME_CHANNEL][0])) > sy.TimeSpan.from_seconds(1)):
             spinner.write(colored("Warning! Averaged values are more than 1 second behind reality!", "red", attrs=["bold"]))
 
         writer.write(write_data)
 
+
+# Works out the time span to backfill from the range or start / end arguments
+def backfill_time_range(client: sy.Synnax, args) -> sy.TimeRange:
+    if args.range != "":
+        try:
+            return client.ranges.retrieve(name=args.range).time_range  # type: ignore
+        except sy.QueryError as e:
+            error_and_exit(f"Could not find range '{args.range}' in Synnax", exception=e)
+    try:
+        start = sy.TimeStamp(datetime.datetime.fromisoformat(args.start))
+        end = sy.TimeStamp.now()
+        if args.end != "":
+            end = sy.TimeStamp(datetime.datetime.fromisoformat(args.end))
+    except ValueError as e:
+        error_and_exit("Invalid start or end time, use ISO 8601 (e.g. 2025-04-12T14:03:00-04:00)", exception=e)
+    return sy.TimeRange(start, end)  # type: ignore
+
+
+# Computes the averages for a span of historical data, reading it in chunks of samples
+# The averages carry over between chunks, so the result is the same as averaging it live
+def backfill(
+    iterator: sy.Iterator, writer: sy.Writer, read_chs: list[str], args
+) -> int:
+    filters = make_filters([ch for ch in read_chs if ch != SENSOR_TIME_CHANNEL], args)
+
+    samples = 0
+    for frame in iterator:
+        write_data = average_frame(frame, filters)
+        if write_data is None:
+            continue
+        writer.write(write_data) # One write per chunk
+        samples += len(write_data[AVG_TIME_CHANNEL])
+        spinner.text = colored(f"Backfilling averages... {samples} samples", "green")
+    return samples
+
+
 def main():
     args = parse_args()
     client = synnax_login(args.cluster)
-    write_chs, read_chs = setup_channels(client)
+    write_chs, read_chs = setup_channels(client, args)
+
+    if (args.range != "") or (args.start != ""):
+        time_range = backfill_time_range(client, args)
+        spinner.text = colored("Backfilling averages...", "green")
+        spinner.start()
+        with client.open_iterator(time_range, read_chs, chunk_size=args.chunk) as iterator:
+            # Persist only, this is history so there's nobody to stream it to
+            with client.open_writer(
+                start=time_range.start, channels=write_chs, mode=sy.WriterMode.PERSIST
+            ) as writer:
+                samples = backfill(iterator, writer, read_chs, args)
+        spinner.stop()
+        print(colored(f"Wrote {samples} averaged samples from {time_range.start} to {time_range.end}", "green", attrs=["bold"]))
+        return
 
     # Streamer for sensor values
     with client.open_streamer(channels=read_chs) as streamer: